@@ -0,0 +1,139 @@
+"""Incrementally maintained order rollups backing /admin/analytics.
+
+A database upgraded from before the rollups has orders but no rollup rows;
+startup fills them in (ensure_order_stats). Run `python -m app.analytics
+rebuild` to recompute them from the orders table by hand, e.g. after
+importing orders directly into the database.
+"""
+from datetime import datetime
+from sqlalchemy import func, case, select, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Order, Product, OrderDailyStat
+
+LOW_STOCK_THRESHOLD = 10
+
+async def _bump(db: AsyncSession, day, order_status: str, count: int, amount: float):
+    stmt = insert(OrderDailyStat).values(
+        day=day,
+        status=order_status,
+        order_count=count,
+        total_amount=amount
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[OrderDailyStat.day, OrderDailyStat.status],
+        set_={
+            "order_count": OrderDailyStat.order_count + stmt.excluded.order_count,
+            "total_amount": OrderDailyStat.total_amount + stmt.excluded.total_amount,
+        }
+    )
+    await db.execute(stmt)
+
+async def record_order_created(db: AsyncSession, order: Order):
+    """Count a new order; call inside the transaction that inserts it"""
+    await _bump(db, order.created_at.date(), order.status, 1, order.total_amount)
+
+async def record_status_change(db: AsyncSession, order: Order, old_status: str):
+    """Move an order between status buckets; call before committing the change"""
+    if old_status == order.status:
+        return
+    day = order.created_at.date()
+    await _bump(db, day, old_status, -1, -order.total_amount)
+    await _bump(db, day, order.status, 1, order.total_amount)
+
+def ensure_order_stats(engine: Engine):
+    """Fill the rollups from the orders table if they are empty but orders exist"""
+    with engine.begin() as conn:
+        # Every worker runs this on startup; the write lock lets one at a time in
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        if conn.scalar(select(OrderDailyStat.day).limit(1)) is not None:
+            return
+        if conn.scalar(select(Order.id).limit(1)) is None:
+            return
+        day = func.date(Order.created_at)
+        conn.execute(insert(OrderDailyStat).from_select(
+            ["day", "status", "order_count", "total_amount"],
+            select(
+                day,
+                Order.status,
+                func.count(Order.id),
+                func.coalesce(func.sum(Order.total_amount), 0.0)
+            ).group_by(day, Order.status)
+        ))
+
+async def rebuild_order_stats(db: AsyncSession) -> int:
+    """Recompute every rollup row from the orders table"""
+    day = func.date(Order.created_at)
+    rows = (await db.execute(
+        select(
+            day,
+            Order.status,
+            func.count(Order.id),
+            func.coalesce(func.sum(Order.total_amount), 0.0)
+        ).group_by(day, Order.status)
+    )).all()
+
+    await db.execute(delete(OrderDailyStat))
+    db.add_all([
+        OrderDailyStat(
+            day=datetime.strptime(row_day, "%Y-%m-%d").date(),
+            status=order_status,
+            order_count=count,
+            total_amount=amount
+        )
+        for row_day, order_status, count, amount in rows
+    ])
+    await db.commit()
+    return len(rows)
+
+async def get_summary(db: AsyncSession) -> dict:
+    """Dashboard totals from the rollup table plus one pass over products"""
+    today = datetime.utcnow().date()
+    delivered = OrderDailyStat.status == "DELIVERED"
+
+    total_revenue, today_revenue, total_orders, pending_orders = (await db.execute(select(
+        func.sum(case((delivered, OrderDailyStat.total_amount), else_=0.0)),
+        func.sum(case(
+            (delivered & (OrderDailyStat.day == today), OrderDailyStat.total_amount),
+            else_=0.0
+        )),
+        func.sum(OrderDailyStat.order_count),
+        func.sum(case(
+            (OrderDailyStat.status == "PENDING", OrderDailyStat.order_count),
+            else_=0
+        ))
+    ))).one()
+
+    total_products, low_stock_products = (await db.execute(select(
+        func.count(Product.id),
+        func.sum(case((Product.stock < LOW_STOCK_THRESHOLD, 1), else_=0))
+    ))).one()
+
+    return {
+        "total_revenue": total_revenue or 0.0,
+        "today_revenue": today_revenue or 0.0,
+        "total_orders": total_orders or 0,
+        "pending_orders": pending_orders or 0,
+        "total_products": total_products or 0,
+        "low_stock_products": low_stock_products or 0
+    }
+
+async def _rebuild():
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        count = await rebuild_order_stats(db)
+    print(f"✓ Rebuilt {count} daily order rollup rows")
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+    from .database import engine, Base
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.analytics rebuild")
+        sys.exit(1)
+
+    Base.metadata.create_all(bind=engine)
+    asyncio.run(_rebuild())
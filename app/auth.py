@@ -1,21 +1,27 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from threading import Lock
 from typing import Optional
+import time
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from .database import get_db
 from .models import Admin, Customer
+from .passwords import pwd_context, password_hasher
 
 # Configuration
 SECRET_KEY = "kpg-shop-secret-key-change-in-production-2024"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Synchronous helpers for scripts such as seed.py; request handlers
+# should await password_hasher instead so bcrypt runs off the threadpool
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -43,50 +49,111 @@ def decode_token(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_current_admin(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> Admin:
-    token = credentials.credentials
+class PrincipalCache:
+    """Bounded LRU of verified tokens and the principal row they resolve to.
+
+    Entries live for at most `ttl` seconds (and never past the token's own
+    expiry), so edits made by another worker become visible within that bound.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1:]
+
+    def put(self, token: str, user_type: str, user_id: int, values: dict, token_exp: float):
+        expires_at = min(time.time() + self.ttl, token_exp)
+        with self._lock:
+            self._entries[token] = (expires_at, user_type, user_id, values)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_type: str, user_id: int):
+        """Drop every cached token that resolves to the given principal"""
+        with self._lock:
+            stale = [
+                token for token, entry in self._entries.items()
+                if entry[1] == user_type and entry[2] == user_id
+            ]
+            for token in stale:
+                del self._entries[token]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+principal_cache = PrincipalCache()
+
+async def _resolve_principal(token: str, user_type: str, model, db: AsyncSession):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        cached_type, _, values = cached
+        if cached_type != user_type:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid authentication credentials"
+            )
+        # Attach a detached copy to this request's session without a SELECT
+        principal = model(**values)
+        make_transient_to_detached(principal)
+        return await db.merge(principal, load=False)
+    
     payload = decode_token(token)
     
-    user_type = payload.get("type")
+    token_type = payload.get("type")
     user_id = payload.get("sub")
     
-    if user_type != "admin" or not user_id:
+    if token_type != user_type or not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
     
-    admin = db.query(Admin).filter(Admin.id == int(user_id)).first()
-    if admin is None:
+    principal = await db.scalar(select(model).where(model.id == int(user_id)))
+    if principal is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Admin not found"
+            detail=f"{user_type.capitalize()} not found"
         )
-    return admin
+    
+    values = {attr.key: getattr(principal, attr.key) for attr in inspect(model).column_attrs}
+    principal_cache.put(token, user_type, principal.id, values, payload["exp"])
+    return principal
+
+async def get_current_admin(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> Admin:
+    return await _resolve_principal(credentials.credentials, "admin", Admin, db)
 
 async def get_current_customer(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Customer:
-    token = credentials.credentials
-    payload = decode_token(token)
-    
-    user_type = payload.get("type")
-    user_id = payload.get("sub")
-    
-    if user_type != "customer" or not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials"
-        )
-    
-    customer = db.query(Customer).filter(Customer.id == int(user_id)).first()
-    if customer is None:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Customer not found"
-        )
-    return customer
+    return await _resolve_principal(credentials.credentials, "customer", Customer, db)
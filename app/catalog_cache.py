@@ -0,0 +1,117 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Awaitable, Callable, Hashable, List, Optional
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from .compression import ENCODINGS, encoded_etag
+from .counters import CATALOG_STOCK_VERSION, CATALOG_VERSION, bump_counter, get_counters
+
+MAX_ENTRIES = 256
+# Checkouts change stock without changing the catalog version; a cached list
+# is re-rendered at most this many seconds after a checkout made it stale
+STOCK_MAX_AGE = 5.0
+
+class CatalogCache:
+    """Pre-serialized catalog responses keyed by (catalog version, query key).
+
+    The version lives in the shared counters table, so every worker drops its
+    entries as soon as any worker commits a catalog write. Checkouts only bump
+    the stock version: an entry rendered before the latest checkout is still
+    served until it is `stock_max_age` seconds old, so bursts of orders don't
+    empty the cache but no list shows stock more than that far out of date.
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, stock_max_age: float = STOCK_MAX_AGE):
+        self.max_entries = max_entries
+        self.stock_max_age = stock_max_age
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def get(self, version: int, stock_version: int, key: Hashable):
+        with self._lock:
+            if version != self._version:
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, etag, entry_stock_version, rendered_at = entry
+            if entry_stock_version != stock_version and time.monotonic() - rendered_at > self.stock_max_age:
+                return None
+            self._entries.move_to_end(key)
+            return body, etag
+
+    def put(self, version: int, stock_version: int, key: Hashable, body: bytes, etag: str):
+        with self._lock:
+            if version != self._version:
+                # Newer catalog: everything cached so far is stale
+                self._entries.clear()
+                self._version = version
+            self._entries[key] = (body, etag, stock_version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+catalog_cache = CatalogCache()
+
+async def bump_catalog_version(db: AsyncSession):
+    """Mark the catalog as changed; call before committing a catalog write"""
+    await bump_counter(db, CATALOG_VERSION)
+
+async def bump_stock_version(db: AsyncSession):
+    """Mark product stock as changed; cached lists catch up within STOCK_MAX_AGE"""
+    await bump_counter(db, CATALOG_STOCK_VERSION)
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(List[schema])
+
+def _matching_etag(request: Request, etag: str) -> Optional[str]:
+    """The If-None-Match entry naming this body, in any encoding (see compression.py), or None"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    representations = {etag, *(encoded_etag(etag, encoding) for encoding in ENCODINGS)}
+    for tag in header.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if tag == "*":
+            return etag
+        if tag in representations:
+            return tag
+    return None
+
+async def cached_catalog_response(
+    request: Request,
+    db: AsyncSession,
+    key: Hashable,
+    schema: Any,
+    load: Callable[[], Awaitable[List[Any]]]
+) -> Response:
+    """Serve `await load()` serialized as List[schema], reusing bytes while the catalog is unchanged"""
+    versions = await get_counters(db, CATALOG_VERSION, CATALOG_STOCK_VERSION)
+    version, stock_version = versions[CATALOG_VERSION], versions[CATALOG_STOCK_VERSION]
+    entry = catalog_cache.get(version, stock_version, key)
+    if entry is None:
+        adapter = _list_adapter(schema)
+        body = adapter.dump_json(adapter.validate_python(await load(), from_attributes=True))
+        etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        catalog_cache.put(version, stock_version, key, body, etag)
+    else:
+        body, etag = entry
+
+    # The body may go out compressed, each encoding with its own ETag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    matched = _matching_etag(request, etag)
+    if matched is not None:
+        # Echo the client's tag: it names the encoding the 200 was sent in
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,200 @@
+"""Catalog delta sync: products changed and rows deleted since a watermark.
+
+Every insert or update of a product, and every tombstone, is stamped with
+the next value of the CHANGE_SEQ counter by SQLite triggers, so no write
+path can forget it. The number is taken inside the write transaction, and
+SQLite runs one write transaction at a time, so numbers become visible in
+commit order: once a reader sees the counter at N, every row numbered up
+to N has committed. (Timestamps can't promise that; a row stamped before a
+slow commit would land behind a watermark already handed out.)
+
+A watermark is an opaque position in that sequence. Each response carries
+the next one; a client that stores it and sends it back as `since` gets
+only what changed in between, plus the ids of products and categories
+deleted meanwhile (apply deletions first, then upserts).
+
+Deletions are recorded as tombstones. Tombstones older than
+TOMBSTONE_RETENTION are compacted away as new ones are written (or with
+`python -m app.changes compact`); a watermark from before the last
+compaction is refused, and the client has to start over without `since`.
+"""
+import base64
+import sys
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from .counters import get_counter, raise_counter
+from .models import CatalogTombstone, Product
+
+CHANGE_SEQ = "catalog_change_seq"
+TOMBSTONE_RETENTION = timedelta(days=30)
+COMPACT_EVERY = 100  # tombstones
+# Change number up to which tombstones may have been compacted away
+TOMBSTONE_HORIZON = "catalog_tombstone_horizon_seq"
+# What decode_watermark returns for watermarks from before change numbers
+LEGACY_WATERMARK = -1
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+def _stamp_trigger(name: str, event: str, table: str, when: str = "") -> str:
+    return f"""
+    CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table} {when} BEGIN
+        UPDATE counters SET value = value + 1 WHERE name = '{CHANGE_SEQ}';
+        UPDATE {table} SET change_seq = (SELECT value FROM counters WHERE name = '{CHANGE_SEQ}')
+        WHERE id = new.id;
+    END
+    """
+
+CHANGE_TRACKING_DDL = [
+    _stamp_trigger("products_change_seq_insert", "INSERT", "products"),
+    # The WHEN clause skips the trigger's own UPDATE (and the backfill below)
+    _stamp_trigger("products_change_seq_update", "UPDATE", "products", "WHEN new.change_seq IS old.change_seq"),
+    _stamp_trigger("catalog_tombstones_change_seq", "INSERT", "catalog_tombstones"),
+]
+
+def _backfill_sql(table: str, order_by: str) -> list:
+    """Number rows written before the triggers existed, continuing the counter"""
+    return [
+        f"""
+        UPDATE {table} SET change_seq = base.value + ordered.n
+        FROM (
+            SELECT id, row_number() OVER (ORDER BY {order_by}) AS n FROM {table} WHERE change_seq IS NULL
+        ) AS ordered, (SELECT value FROM counters WHERE name = '{CHANGE_SEQ}') AS base
+        WHERE {table}.id = ordered.id
+        """,
+        f"""
+        UPDATE counters SET value = max(value, (SELECT coalesce(max(change_seq), 0) FROM {table}))
+        WHERE name = '{CHANGE_SEQ}'
+        """,
+    ]
+
+def ensure_change_tracking(engine: Engine):
+    """Add change_seq to tables created without it, install the triggers and number existing rows"""
+    with engine.begin() as conn:
+        # Every worker runs this on startup; the write lock lets one at a time in
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        for table in ("products", "catalog_tombstones"):
+            columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            if "change_seq" not in columns:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN change_seq INTEGER")
+        # Here rather than in main.py's index loop, which races between workers
+        for index in (*Product.__table__.indexes, *CatalogTombstone.__table__.indexes):
+            if "change_seq" in index.columns:
+                index.create(bind=conn, checkfirst=True)
+        conn.exec_driver_sql("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (CHANGE_SEQ,))
+        for statement in CHANGE_TRACKING_DDL:
+            conn.exec_driver_sql(statement)
+        for statement in _backfill_sql("products", "updated_at, id") + _backfill_sql("catalog_tombstones", "id"):
+            conn.exec_driver_sql(statement)
+
+def encode_watermark(change_seq: int) -> str:
+    return base64.urlsafe_b64encode(str(change_seq).encode()).decode().rstrip("=")
+
+def decode_watermark(watermark: str) -> int:
+    """Raises ValueError for anything encode_watermark did not produce.
+
+    Watermarks from before change numbers ("<updated_at>|<id>") decode as
+    LEGACY_WATERMARK, which watermark_expired refuses.
+    """
+    padded = watermark + "=" * (-len(watermark) % 4)
+    raw = base64.urlsafe_b64decode(padded).decode()
+    if "|" in raw:
+        # Still checked, so that garbage containing "|" is a 400 rather than a 410
+        updated_at, product_id = raw.split("|")
+        datetime.fromisoformat(updated_at)
+        int(product_id)
+        return LEGACY_WATERMARK
+    change_seq = int(raw)
+    if change_seq < 0:
+        raise ValueError(watermark)
+    return change_seq
+
+async def record_tombstone(db: AsyncSession, entity: str, entity_id: int):
+    """Log a deletion; call inside the transaction that deletes the row"""
+    tombstone = CatalogTombstone(entity=entity, entity_id=entity_id)
+    db.add(tombstone)
+    await db.flush()
+    if tombstone.id % COMPACT_EVERY == 0:
+        await compact_tombstones(db)
+
+async def compact_tombstones(db: AsyncSession, retention: timedelta = TOMBSTONE_RETENTION) -> int:
+    """Drop tombstones older than `retention` and move the horizon up; returns the count"""
+    cutoff = datetime.utcnow() - retention
+    horizon = await db.scalar(
+        select(func.max(CatalogTombstone.change_seq)).where(CatalogTombstone.deleted_at < cutoff)
+    )
+    result = await db.execute(
+        delete(CatalogTombstone).where(CatalogTombstone.deleted_at < cutoff)
+    )
+    if horizon is not None:
+        await raise_counter(db, TOMBSTONE_HORIZON, horizon)
+    return result.rowcount
+
+async def watermark_expired(db: AsyncSession, since: int) -> bool:
+    """True if deletions after `since` may already have been compacted away"""
+    if since == LEGACY_WATERMARK:
+        return True
+    return since < await get_counter(db, TOMBSTONE_HORIZON)
+
+async def load_changes(db: AsyncSession, since: Optional[int], limit: int) -> dict:
+    """One page of changes after `since` (everything if None), oldest first"""
+    # Read before the rows: everything numbered up to here has committed
+    newest = await get_counter(db, CHANGE_SEQ)
+
+    products = (await db.scalars(
+        select(Product)
+        .where(Product.change_seq > (since or 0), Product.change_seq <= newest)
+        .order_by(Product.change_seq)
+        .limit(limit + 1)
+    )).all()
+
+    has_more = len(products) > limit
+    if has_more:
+        products = products[:limit]
+        page_end = products[-1].change_seq
+    else:
+        page_end = newest
+
+    deleted = {"product": [], "category": []}
+    if since is not None:
+        tombstones = await db.execute(
+            select(CatalogTombstone.entity, CatalogTombstone.entity_id)
+            .where(
+                CatalogTombstone.change_seq > since,
+                CatalogTombstone.change_seq <= page_end
+            )
+            .order_by(CatalogTombstone.change_seq)
+        )
+        for entity, entity_id in tombstones:
+            deleted[entity].append(entity_id)
+
+    return {
+        "products": products,
+        "deleted_product_ids": deleted["product"],
+        "deleted_category_ids": deleted["category"],
+        "watermark": encode_watermark(page_end),
+        "has_more": has_more
+    }
+
+async def _compact():
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        removed = await compact_tombstones(db)
+        await db.commit()
+    print(f"✓ Removed {removed} tombstones older than {TOMBSTONE_RETENTION.days} days")
+
+if __name__ == "__main__":
+    import asyncio
+    from .database import engine, Base
+
+    if sys.argv[1:] != ["compact"]:
+        print("Usage: python -m app.changes compact")
+        sys.exit(1)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_change_tracking(engine)
+    asyncio.run(_compact())
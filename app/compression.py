@@ -0,0 +1,165 @@
+"""Negotiated brotli/gzip compression for API responses.
+
+Starlette's GZipMiddleware only speaks gzip; brotli is typically 15-25%
+smaller on JSON at a similar CPU cost. Responses are compressed when the
+client accepts it, the body is at least `minimum_size` bytes and the type
+is text-like. Bodies that are already encoded (precompressed uploads, the
+gzipped order export), partial content, images and event streams pass
+through untouched. Streaming bodies are compressed chunk by chunk.
+
+A compressed body is a different representation, so its ETag gets the
+coding appended ("abc" becomes "abc-br"); a strong validator never covers
+more than one encoding of the body.
+"""
+import re
+import zlib
+from typing import Dict, Optional
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+MINIMUM_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # 0-11; higher levels cost far more CPU than they save bytes on JSON
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/", "image/svg+xml")
+# Never buffered or re-encoded: clients read these incrementally
+EXCLUDED_TYPES = ("text/event-stream",)
+ENCODINGS = ("br", "gzip")
+
+def _accepted_encodings(header: str) -> Dict[str, float]:
+    encodings = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        encodings[name.strip().lower()] = quality
+    return encodings
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best of br / gzip the client accepts, or None"""
+    encodings = _accepted_encodings(accept_encoding)
+    best, best_quality = None, 0.0
+    for name in ENCODINGS:
+        quality = encodings.get(name, encodings.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of the `encoding`-compressed body of a response tagged `etag`"""
+    return f'{etag[:-1]}-{encoding}"' if etag.endswith('"') else etag
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush()
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+
+class _CompressingSend:
+    def __init__(self, send: Send, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _should_compress(self, headers: Headers) -> bool:
+        if self.start["status"] != 200 or "content-encoding" in headers or "content-range" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        if content_type.startswith(EXCLUDED_TYPES):
+            return False
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    async def __call__(self, message: Message):
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            self.start = message
+            headers = Headers(raw=message["headers"])
+            if self._should_compress(headers):
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+            else:
+                self.passthrough = True
+                await self.send(message)
+            return
+
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message_type != "http.response.body":
+            # pathsend / zerocopysend: the server writes the file, leave it alone
+            self.passthrough = True
+            await self.send(self.start)
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding)
+            headers = MutableHeaders(raw=self.start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            if "etag" in headers:
+                headers["ETag"] = encoded_etag(headers["etag"], self.encoding)
+            if more_body:
+                del headers["Content-Length"]
+                await self.send(self.start)
+                chunk = self.compressor.compress(body)
+                if chunk:
+                    await self.send({"type": "http.response.body", "body": chunk, "more_body": True})
+                return
+            compressed = self.compressor.compress(body) + self.compressor.finish()
+            headers["Content-Length"] = str(len(compressed))
+            await self.send(self.start)
+            await self.send({"type": "http.response.body", "body": compressed})
+            return
+
+        chunk = self.compressor.compress(body)
+        if not more_body:
+            chunk += self.compressor.finish()
+        if chunk or not more_body:
+            await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
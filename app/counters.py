@@ -0,0 +1,36 @@
+from typing import Dict
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import Counter
+
+CATALOG_VERSION = "catalog_version"
+CATALOG_STOCK_VERSION = "catalog_stock_version"
+
+async def bump_counter(db: AsyncSession, name: str):
+    """Increment a shared counter inside the caller's transaction"""
+    stmt = insert(Counter).values(name=name, value=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Counter.name],
+        set_={"value": Counter.value + 1}
+    )
+    await db.execute(stmt)
+
+async def raise_counter(db: AsyncSession, name: str, value: int):
+    """Set a shared counter to `value` unless it is already higher"""
+    stmt = insert(Counter).values(name=name, value=value)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Counter.name],
+        set_={"value": func.max(Counter.value, stmt.excluded.value)}
+    )
+    await db.execute(stmt)
+
+async def get_counter(db: AsyncSession, name: str) -> int:
+    value = await db.scalar(select(Counter.value).where(Counter.name == name))
+    return value or 0
+
+async def get_counters(db: AsyncSession, *names: str) -> Dict[str, int]:
+    """Several counters in one query; missing ones are 0"""
+    rows = await db.execute(select(Counter.name, Counter.value).where(Counter.name.in_(names)))
+    values = dict(rows.all())
+    return {name: values.get(name) or 0 for name in names}
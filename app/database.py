@@ -1,20 +1,89 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .metrics import instrument_engine
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./kpg_shop.db"
+DATABASE_PATH = os.getenv("KPG_DATABASE_PATH", "./kpg_shop.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+ASYNC_SQLALCHEMY_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
 
+# Pragmas applied to every new SQLite connection. WAL lets readers run
+# alongside the writer, busy_timeout makes writers from other processes wait
+# for the lock instead of failing with "database is locked".
+# Each value can be overridden with KPG_SQLITE_<NAME>, e.g. KPG_SQLITE_JOURNAL_MODE=DELETE
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": "5000",       # milliseconds
+    "cache_size": "-65536",       # negative means KiB, i.e. 64 MiB
+    "mmap_size": "268435456",     # 256 MiB
+    "temp_store": "MEMORY",
+}
+SQLITE_PRAGMAS = {
+    name: os.getenv(f"KPG_SQLITE_{name.upper()}", value)
+    for name, value in SQLITE_PRAGMAS.items()
+}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# Synchronous engine for table creation and command-line scripts (seed, rebuilds)
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+event.listen(engine, "connect", _apply_sqlite_pragmas)
+
+# Async engine used by every request handler. aiosqlite defaults to NullPool,
+# which would open a connection (and a driver thread) per session
+async_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=int(os.getenv("KPG_DB_POOL_SIZE", "8")),
+    max_overflow=int(os.getenv("KPG_DB_MAX_OVERFLOW", "8"))
+)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+# Single connection owned by the write queue (see writer.py). The driver's
+# implicit transactions are turned off and every transaction starts with
+# BEGIN IMMEDIATE, which takes the write lock up front and makes SAVEPOINTs
+# behave, so one failed job can roll back without losing the rest of a batch.
+writer_engine = create_async_engine(
+    ASYNC_SQLALCHEMY_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=1,
+    max_overflow=0
+)
+WriterSessionLocal = async_sessionmaker(
+    writer_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+@event.listens_for(writer_engine.sync_engine, "connect")
+def _writer_connect(dbapi_connection, connection_record):
+    _apply_sqlite_pragmas(dbapi_connection, connection_record)
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(writer_engine.sync_engine, "begin")
+def _writer_begin(conn):
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+# Per-request SQL count/time and the slow-query log (see metrics.py)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+instrument_engine(writer_engine.sync_engine)
 
 Base = declarative_base()
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
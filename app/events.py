@@ -0,0 +1,212 @@
+"""Order change feed pushed to the admin app over server-sent events.
+
+create_order and update_order_status append a row to order_events inside
+the same write transaction as the change itself, so an event exists exactly
+when its change is committed. The table doubles as the broker between
+worker processes: each worker runs one OrderEventBroker task that, while it
+has subscribers, reads new rows by id every POLL_INTERVAL seconds (and
+immediately after a commit made by this worker) and fans them out to its
+SSE connections.
+
+SQLite commits one write transaction at a time, so ids become visible in
+increasing order and "id > last seen" never skips an event. A client that
+reconnects with Last-Event-ID gets everything after it from the table; so
+does a connection whose queue overflowed. Events older than RETENTION are
+pruned as new ones are written; a client that was away longer than that is
+sent a `reset` event and should reload GET /orders.
+"""
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Set, Tuple
+import orjson
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import AsyncSessionLocal
+from .models import Order, OrderEvent
+from .schemas import OrderResponse
+
+ORDER_CREATED = "order_created"
+ORDER_STATUS_CHANGED = "order_status_changed"
+
+POLL_INTERVAL = 0.5       # seconds between table reads while anyone listens
+HEARTBEAT_INTERVAL = 15   # seconds; keeps proxies from closing idle streams
+RETRY_MS = 3000           # client reconnect delay
+QUEUE_SIZE = 256          # per connection; overflow is re-read from the table
+PAGE_SIZE = 500
+RETENTION = timedelta(days=7)
+PRUNE_EVERY = 1000        # events
+
+@dataclass
+class EventMessage:
+    id: int
+    event_type: str
+    data: str
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.event_type}\ndata: {self.data}\n\n"
+
+async def record_order_event(db: AsyncSession, event_type: str, order: Order, **extra):
+    """Append an event for `order`; call inside the transaction that changes it"""
+    data = {"order": OrderResponse.model_validate(order).model_dump(mode="json"), **extra}
+    event = OrderEvent(event_type=event_type, order_id=order.id, payload=orjson.dumps(data).decode())
+    db.add(event)
+    await db.flush()
+    if event.id % PRUNE_EVERY == 0:
+        await db.execute(
+            delete(OrderEvent).where(OrderEvent.created_at < datetime.utcnow() - RETENTION)
+        )
+
+async def _read_events(db: AsyncSession, after_id: int) -> List[EventMessage]:
+    rows = await db.execute(
+        select(OrderEvent.id, OrderEvent.event_type, OrderEvent.payload)
+        .where(OrderEvent.id > after_id)
+        .order_by(OrderEvent.id)
+        .limit(PAGE_SIZE)
+    )
+    return [EventMessage(*row) for row in rows]
+
+class OrderEventBroker:
+    def __init__(self, poll_interval: float = POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._wakeup = None
+        self._task = None
+        self._loop = None
+        self._last_id = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._last_id = None
+            self._task = loop.create_task(self._run())
+
+    def subscribe(self, after_id: int) -> Tuple[asyncio.Queue, int]:
+        """New queue for events; `after_id` is the newest id the caller has read.
+
+        Returns the queue and the id after which events will be put on it;
+        anything up to that id the caller reads from the table itself.
+        """
+        self._ensure_started()
+        if self._last_id is None:
+            # Start the broker where the caller's read ended, not at a
+            # separate read of its own that could already be further on
+            self._last_id = after_id
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue, self._last_id
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def notify(self):
+        """Poll now: this worker just committed an event"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._subscribers:
+                # Nobody to tell; subscribers fill any gap from the table themselves
+                self._last_id = None
+                continue
+            try:
+                await self._poll()
+            except Exception:
+                # A locked or busy database: try again on the next tick
+                continue
+
+    async def _poll(self):
+        async with AsyncSessionLocal() as db:
+            if self._last_id is None:
+                newest = await db.scalar(select(func.max(OrderEvent.id))) or 0
+                if self._last_id is None:
+                    self._last_id = newest
+                return
+            while True:
+                events = await _read_events(db, self._last_id)
+                for event in events:
+                    for queue in list(self._subscribers):
+                        try:
+                            queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            pass
+                if events:
+                    self._last_id = events[-1].id
+                if len(events) < PAGE_SIZE:
+                    return
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+order_event_broker = OrderEventBroker()
+
+async def _catch_up(after_id: int, until_id: Optional[int] = None) -> AsyncIterator[EventMessage]:
+    """Events after `after_id` from the table, up to `until_id` if given"""
+    async with AsyncSessionLocal() as db:
+        while True:
+            events = await _read_events(db, after_id)
+            for event in events:
+                if until_id is not None and event.id > until_id:
+                    return
+                yield event
+            if len(events) < PAGE_SIZE:
+                return
+            after_id = events[-1].id
+
+async def order_event_stream(last_event_id: Optional[int]) -> AsyncIterator[str]:
+    """SSE body: events after `last_event_id` (or only new ones), then live events"""
+    queue = None
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        async with AsyncSessionLocal() as db:
+            oldest = await db.scalar(select(func.min(OrderEvent.id)))
+            newest = await db.scalar(select(func.max(OrderEvent.id))) or 0
+        queue, delivered_after = order_event_broker.subscribe(newest)
+        if last_event_id is None:
+            last_sent = newest
+        else:
+            last_sent = last_event_id
+            if oldest is not None and oldest > last_sent + 1:
+                # Events the client missed were pruned: it has to reload
+                yield f"event: reset\ndata: {{\"oldest_event_id\": {oldest}}}\n\n"
+                last_sent = oldest - 1
+        # Only events after delivered_after reach the queue. Any committed
+        # since our read that the broker had already passed on come from the
+        # table, as does everything a resuming client missed
+        until_id = delivered_after if last_event_id is None else None
+        async for event in _catch_up(last_sent, until_id):
+            yield event.encode()
+            last_sent = event.id
+
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event.id <= last_sent:
+                continue
+            if event.id > last_sent + 1:
+                # Queue overflowed or the stream started between polls
+                async for missed in _catch_up(last_sent, event.id - 1):
+                    yield missed.encode()
+                    last_sent = missed.id
+            yield event.encode()
+            last_sent = event.id
+    finally:
+        if queue is not None:
+            order_event_broker.unsubscribe(queue)
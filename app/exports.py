@@ -0,0 +1,89 @@
+"""Constant-memory order export as NDJSON or CSV, optionally gzipped.
+
+Orders are read with a server-side cursor in batches of EXPORT_BATCH_SIZE
+rows; the items for each batch come from one IN query. Only one batch is
+ever held in memory, however many orders match.
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Dict, List
+from sqlalchemy import select
+from .database import AsyncSessionLocal
+from .models import Order, OrderItem
+
+EXPORT_BATCH_SIZE = 500
+
+ORDER_COLUMNS = [
+    "id", "customer_id", "customer_name", "customer_phone", "delivery_address",
+    "total_amount", "payment_mode", "status", "note", "created_at", "updated_at",
+]
+ITEM_COLUMNS = ["product_id", "product_name", "quantity", "price_at_order"]
+CSV_HEADER = ["order_id"] + ORDER_COLUMNS[1:] + ITEM_COLUMNS
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+async def _order_batches(query) -> AsyncIterator[List[Dict]]:
+    """Yield lists of order dicts, each with its "items", one batch at a time"""
+    order_table = Order.__table__
+    item_table = OrderItem.__table__
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(
+            query.with_only_columns(*order_table.c).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        )
+        async for partition in result.mappings().partitions():
+            orders = {row["id"]: {**row, "items": []} for row in partition}
+            items = await db.execute(
+                select(*item_table.c)
+                .where(item_table.c.order_id.in_(orders))
+                .order_by(item_table.c.order_id, item_table.c.id)
+            )
+            for item in items.mappings():
+                orders[item["order_id"]]["items"].append(item)
+            yield list(orders.values())
+
+def _ndjson(batch: List[Dict]) -> str:
+    lines = []
+    for order in batch:
+        record = {column: _plain(order[column]) for column in ORDER_COLUMNS}
+        record["items"] = [
+            {"id": item["id"], **{column: item[column] for column in ITEM_COLUMNS}}
+            for item in order["items"]
+        ]
+        lines.append(json.dumps(record, separators=(",", ":")))
+    return "\n".join(lines) + "\n"
+
+def _csv(batch: List[Dict]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for order in batch:
+        order_values = [_plain(order[column]) for column in ORDER_COLUMNS]
+        # One row per line item; orders without items still get a row
+        for item in order["items"] or [None]:
+            item_values = [item[column] for column in ITEM_COLUMNS] if item else [""] * len(ITEM_COLUMNS)
+            writer.writerow(order_values + item_values)
+    return buffer.getvalue()
+
+async def stream_orders(query, export_format: str, compress: bool) -> AsyncIterator[bytes]:
+    """Serialize the orders selected by `query` chunk by chunk"""
+    compressor = zlib.compressobj(wbits=31) if compress else None
+
+    def encode(text: str) -> bytes:
+        data = text.encode()
+        return compressor.compress(data) if compressor else data
+
+    if export_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(CSV_HEADER)
+        yield encode(buffer.getvalue())
+
+    serialize = _csv if export_format == "csv" else _ndjson
+    async for batch in _order_batches(query):
+        chunk = encode(serialize(batch))
+        if chunk:
+            yield chunk
+
+    if compressor:
+        yield compressor.flush()
@@ -0,0 +1,115 @@
+"""Idempotency-Key support for POST /orders.
+
+A client that may retry sends the same Idempotency-Key header with every
+attempt. The first attempt to succeed stores its response under
+(customer, key) in the same write transaction that places the order, so
+the order and its stored response commit or roll back together. Later
+attempts with that key get the stored response back, marked with
+`Idempotent-Replayed: true`, and nothing is written again.
+
+Duplicates that arrive while the first attempt is still running wait for
+it: inside one worker through an in-flight map, across workers because the
+write queue's transactions are serialized and the second one finds the
+first one's committed row. Failed attempts (e.g. 409 out of stock) store
+nothing and may be retried. Keys expire after IDEMPOTENCY_TTL; reusing a
+live key with a different request body is rejected with 422.
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Tuple, Union
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from .models import IdempotencyKey
+from .writer import write_queue
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+PRUNE_EVERY = 500  # stored keys per worker between sweeps of expired ones
+
+@dataclass
+class StoredResponse:
+    status_code: int
+    body: str
+
+_in_flight: Dict[Tuple[int, str], asyncio.Future] = {}
+_stored_since_prune = 0
+
+def request_fingerprint(payload: BaseModel) -> str:
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+async def _run_job(
+    db: AsyncSession,
+    customer_id: int,
+    key: str,
+    fingerprint: str,
+    job: Callable[[AsyncSession], Awaitable[Any]],
+    serialize: Callable[[Any], str]
+):
+    global _stored_since_prune
+    now = datetime.utcnow()
+    record = await db.get(IdempotencyKey, (customer_id, key))
+    if record is not None and record.expires_at > now:
+        if record.request_hash != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used with a different request"
+            )
+        return StoredResponse(record.status_code, record.response_body)
+    if record is not None:
+        await db.delete(record)
+        await db.flush()
+
+    result = await job(db)
+    db.add(IdempotencyKey(
+        customer_id=customer_id,
+        key=key,
+        request_hash=fingerprint,
+        status_code=200,
+        response_body=serialize(result),
+        created_at=now,
+        expires_at=now + IDEMPOTENCY_TTL
+    ))
+    await db.flush()
+
+    _stored_since_prune += 1
+    if _stored_since_prune >= PRUNE_EVERY:
+        _stored_since_prune = 0
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= now))
+    return result
+
+async def submit_once(
+    customer_id: int,
+    key: str,
+    fingerprint: str,
+    job: Callable[[AsyncSession], Awaitable[Any]],
+    serialize: Callable[[Any], str]
+) -> Union[Any, StoredResponse]:
+    """Run `job` through the write queue unless `key` already has a stored response.
+
+    Returns the job's result, or the StoredResponse of an earlier attempt.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"
+        )
+
+    slot = (customer_id, key)
+    while slot in _in_flight:
+        # Same key still being processed in this worker: wait, then replay
+        # its stored response (or retry, if it failed)
+        await asyncio.wait([_in_flight[slot]])
+
+    done = asyncio.get_running_loop().create_future()
+    _in_flight[slot] = done
+    try:
+        return await write_queue.submit(
+            lambda db: _run_job(db, customer_id, key, fingerprint, job, serialize)
+        )
+    finally:
+        del _in_flight[slot]
+        done.set_result(None)
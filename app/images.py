@@ -0,0 +1,179 @@
+"""Resized WebP/AVIF derivatives of product images.
+
+Every stored image gets one file per (size, format) pair next to it under
+variants/, named after the original, so the URLs can be derived from a
+product's image_path alone. Besides WebP/AVIF, each size is also written in
+the image's own format, for clients whose Accept header lists neither.
+Generation is CPU heavy and runs in a small process pool after the upload
+has been answered. To process images that were uploaded before variants
+existed:
+
+    python -m app.images backfill [--force]
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WORKERS = 2
+PRODUCT_IMAGE_DIR = os.path.join("uploads", "products")
+VARIANT_DIRNAME = "variants"
+
+# name -> (width, height, crop): "thumb" is cropped to exactly that size for
+# list tiles, "medium" is only scaled down to fit for detail screens
+VARIANT_SIZES = {
+    "thumb": (200, 200, True),
+    "medium": (800, 800, False),
+}
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60, "speed": 8},
+}
+if not features.check("avif"):
+    del VARIANT_FORMATS["avif"]
+# Resized copies in the source's own format; any client that can show the
+# original can show these
+SOURCE_FORMATS = {
+    "jpg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+    "png": {"format": "PNG", "optimize": True},
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+}
+
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+def variant_urls(image_path: Optional[str]) -> Optional[Dict[str, str]]:
+    """URL per size of a locally stored image, e.g. urls["thumb"].
+
+    These are ?size= URLs rather than the variant files themselves: the
+    server picks the AVIF/WebP file the client accepts, else the resize in
+    the original's format, and answers with the original while a variant is
+    missing (not generated yet), so an advertised URL never 404s.
+    """
+    if not image_path or not image_path.startswith("/uploads/"):
+        return None
+    return {size: f"{image_path}?size={size}" for size in VARIANT_SIZES}
+
+def source_format(filename: str) -> Optional[str]:
+    """Key into SOURCE_FORMATS for an original image's file name, or None"""
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    extension = "jpg" if extension == "jpeg" else extension
+    return extension if extension in SOURCE_FORMATS else None
+
+def _variant_file(source_file: str, size: str, fmt: str) -> str:
+    directory, filename = os.path.split(source_file)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, VARIANT_DIRNAME, f"{stem}-{size}.{fmt}")
+
+def generate_variants(source_file: str, force: bool = False) -> int:
+    """Write every missing derivative of `source_file`; returns how many were written"""
+    formats = dict(VARIANT_FORMATS)
+    own_format = source_format(source_file)
+    if own_format is not None:
+        formats.setdefault(own_format, SOURCE_FORMATS[own_format])
+    targets = [
+        (size, fmt, _variant_file(source_file, size, fmt))
+        for size in VARIANT_SIZES
+        for fmt in formats
+    ]
+    if not force:
+        targets = [target for target in targets if not os.path.exists(target[2])]
+    if not targets:
+        return 0
+
+    os.makedirs(os.path.dirname(targets[0][2]), exist_ok=True)
+    with Image.open(source_file) as original:
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    resized = {}
+    for size, fmt, target in targets:
+        if size not in resized:
+            width, height, crop = VARIANT_SIZES[size]
+            if crop:
+                resized[size] = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            else:
+                resized[size] = image.copy()
+                resized[size].thumbnail((width, height), Image.LANCZOS)
+        # Write beside the target and rename, so a half-written file is never served
+        temp_target = f"{target}.{os.getpid()}.tmp"
+        variant = resized[size]
+        if formats[fmt]["format"] == "JPEG" and variant.mode != "RGB":
+            variant = variant.convert("RGB")
+        variant.save(temp_target, **formats[fmt])
+        os.replace(temp_target, target)
+    return len(targets)
+
+class ImageProcessor:
+    """Generates image variants in a process pool, off the request path"""
+
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks = set()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Created lazily so scripts importing the app never spawn workers
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def submit(self, image_path: str):
+        """Queue variant generation for an image stored under /uploads; returns immediately"""
+        source_file = image_path.lstrip("/")
+        task = asyncio.get_running_loop().create_task(self._generate(source_file))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _generate(self, source_file: str):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._get_pool(), generate_variants, source_file)
+        except Exception:
+            logger.exception("Generating variants for %s failed", source_file)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+image_processor = ImageProcessor()
+
+def backfill(force: bool = False, workers: int = IMAGE_WORKERS):
+    """Generate variants for every image in uploads/products"""
+    sources = sorted(
+        os.path.join(PRODUCT_IMAGE_DIR, name)
+        for name in os.listdir(PRODUCT_IMAGE_DIR)
+        if os.path.splitext(name)[1].lower() in SOURCE_EXTENSIONS
+    )
+    written = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(source, pool.submit(generate_variants, source, force)) for source in sources]
+        for source, future in futures:
+            try:
+                written += future.result()
+            except Exception as e:
+                failed += 1
+                print(f"✗ {source}: {e}")
+    print(f"✓ {len(sources)} images, {written} variants written, {failed} failed")
+
+if __name__ == "__main__":
+    import sys
+
+    if not sys.argv[1:] or sys.argv[1] != "backfill" or set(sys.argv[2:]) - {"--force"}:
+        print("Usage: python -m app.images backfill [--force]")
+        sys.exit(1)
+
+    backfill(force="--force" in sys.argv[2:])
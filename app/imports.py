@@ -0,0 +1,267 @@
+"""Streaming bulk upsert of products from CSV or NDJSON.
+
+Rows are parsed as the request body arrives and applied in chunks of
+IMPORT_CHUNK_SIZE. Each chunk is a single write-queue job, and so a single
+transaction: one IN lookup of existing names followed by executemany UPDATE
+and INSERT statements. Products are matched on their name, which is the
+natural key used by the price lists; a row whose name is shared by several
+existing products is rejected as ambiguous rather than updating them all.
+
+CSV input needs a header row; one record per line (quoted newlines are not
+supported). Columns / NDJSON keys: name (required), category or category_id,
+price, stock, is_available, image_path. A body that is not valid UTF-8 stops
+the import with 400; every complete line before the bad byte is applied, and
+the error says how far the import got.
+"""
+import codecs
+import csv
+import json
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .catalog_cache import bump_catalog_version
+from .models import Category, Product
+from .writer import write_queue
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"0", "false", "no", "n", "f"}
+
+class RowError(ValueError):
+    pass
+
+class EncodingError(ValueError):
+    def __init__(self, offset: int):
+        super().__init__(f"Body is not valid UTF-8 at byte {offset}")
+        self.offset = offset
+
+async def _lines(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    consumed = 0
+    async for chunk in body:
+        buffered = len(decoder.getstate()[0])
+        error = None
+        try:
+            pending += decoder.decode(chunk)
+        except UnicodeDecodeError as e:
+            # e.start counts from the bytes the decoder still held back;
+            # the lines before the bad byte are still handed over
+            error = EncodingError(consumed - buffered + e.start)
+            pending += decoder.decode(chunk[:max(e.start - buffered, 0)])
+        consumed += len(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+        if error is not None:
+            raise error
+    try:
+        pending += decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        raise EncodingError(consumed - len(decoder.getstate()[0]) + e.start)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def parse_rows(body: AsyncIterator[bytes], import_format: str) -> AsyncIterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """Yield (row number, raw record, parse error) for every non-blank input row"""
+    header = None
+    row_number = 0
+    async for line in _lines(body):
+        if not line.strip():
+            continue
+        if import_format == "csv" and header is None:
+            header = [column.strip().lower() for column in next(csv.reader([line]))]
+            continue
+        row_number += 1
+        try:
+            if import_format == "csv":
+                values = next(csv.reader([line]))
+                record = dict(zip(header, values))
+            else:
+                record = json.loads(line)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+        except (ValueError, csv.Error) as e:
+            yield row_number, None, f"Malformed row: {e}"
+            continue
+        yield row_number, record, None
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f"Invalid is_available: {value!r}")
+
+def normalize_row(record: Dict, categories: Dict[str, int], category_ids: set) -> Dict:
+    """Validate one raw record into column values; only fields present are set"""
+    name = record.get("name")
+    if _blank(name):
+        raise RowError("Missing name")
+    values = {"name": str(name).strip()}
+
+    if not _blank(record.get("category")):
+        category_name = str(record["category"]).strip()
+        if category_name.lower() not in categories:
+            raise RowError(f"Unknown category: {category_name}")
+        values["category_id"] = categories[category_name.lower()]
+    elif not _blank(record.get("category_id")):
+        try:
+            category_id = int(record["category_id"])
+        except (TypeError, ValueError):
+            raise RowError(f"Invalid category_id: {record['category_id']!r}")
+        if category_id not in category_ids:
+            raise RowError(f"Unknown category_id: {category_id}")
+        values["category_id"] = category_id
+
+    if not _blank(record.get("price")):
+        try:
+            values["price"] = float(record["price"])
+        except (TypeError, ValueError):
+            raise RowError(f"Invalid price: {record['price']!r}")
+        if values["price"] < 0:
+            raise RowError("Price cannot be negative")
+
+    if not _blank(record.get("stock")):
+        try:
+            values["stock"] = int(record["stock"])
+        except (TypeError, ValueError):
+            raise RowError(f"Invalid stock: {record['stock']!r}")
+        if values["stock"] < 0:
+            raise RowError("Stock cannot be negative")
+
+    if not _blank(record.get("is_available")):
+        values["is_available"] = _to_bool(record["is_available"])
+
+    if not _blank(record.get("image_path")):
+        values["image_path"] = str(record["image_path"]).strip()
+
+    return values
+
+async def _apply_chunk(db: AsyncSession, rows: List[Tuple[int, Dict]]) -> Dict:
+    """Write job: upsert one chunk of validated rows by product name"""
+    # Repeated names are merged, later rows overriding earlier ones field by field
+    latest = {}
+    for row_number, values in rows:
+        merged = {**latest[values["name"]][1], **values} if values["name"] in latest else values
+        latest[values["name"]] = (row_number, merged)
+
+    existing = dict((await db.execute(
+        select(Product.name, func.count()).where(Product.name.in_(latest)).group_by(Product.name)
+    )).all())
+
+    now = datetime.utcnow()
+    updates_by_columns: Dict[tuple, List[Dict]] = {}
+    inserts = []
+    errors = []
+    for name, (row_number, values) in latest.items():
+        if existing.get(name, 0) > 1:
+            errors.append({"row": row_number, "error": f"Ambiguous name: {existing[name]} products are called {name!r}"})
+        elif name in existing:
+            columns = tuple(sorted(key for key in values if key != "name"))
+            if columns:
+                params = {f"v_{key}": values[key] for key in columns}
+                params["b_name"] = name
+                updates_by_columns.setdefault(columns, []).append(params)
+        elif "category_id" not in values or "price" not in values:
+            errors.append({"row": row_number, "error": "New products need a category and a price"})
+        else:
+            inserts.append({
+                "stock": 0,
+                "is_available": True,
+                "image_path": None,
+                **values,
+                "created_at": now,
+                "updated_at": now,
+            })
+
+    table = Product.__table__
+    updated = 0
+    for columns, params in updates_by_columns.items():
+        stmt = update(table).where(table.c.name == bindparam("b_name")).values(
+            {**{key: bindparam(f"v_{key}") for key in columns}, "updated_at": now}
+        )
+        result = await db.execute(stmt, params)
+        updated += result.rowcount
+
+    if inserts:
+        await db.execute(insert(table), inserts)
+
+    if updated or inserts:
+        await bump_catalog_version(db)
+
+    return {"inserted": len(inserts), "updated": updated, "errors": errors}
+
+async def import_products(body: AsyncIterator[bytes], import_format: str, db: AsyncSession) -> Dict:
+    """Parse the upload and upsert it chunk by chunk; returns a per-row report"""
+    categories = {}
+    category_ids = set()
+    for category_id, name in (await db.execute(select(Category.id, Category.name))).all():
+        categories[name.lower()] = category_id
+        category_ids.add(category_id)
+
+    report = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+
+    def add_error(row_number, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": row_number, "error": message})
+
+    applied_through_row = 0
+
+    async def flush(chunk):
+        nonlocal applied_through_row
+        result = await write_queue.submit(lambda writer_db: _apply_chunk(writer_db, chunk))
+        applied_through_row = chunk[-1][0]
+        report["inserted"] += result["inserted"]
+        report["updated"] += result["updated"]
+        for error in result["errors"]:
+            add_error(error["row"], error["error"])
+
+    chunk = []
+    try:
+        async for row_number, record, parse_error in parse_rows(body, import_format):
+            report["rows"] += 1
+            if parse_error:
+                add_error(row_number, parse_error)
+                continue
+            try:
+                chunk.append((row_number, normalize_row(record, categories, category_ids)))
+            except RowError as e:
+                add_error(row_number, str(e))
+                continue
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await flush(chunk)
+                chunk = []
+    except EncodingError as e:
+        # Complete lines before the bad byte are applied like any other
+        # rows, then the report says exactly how far we got
+        if chunk:
+            await flush(chunk)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": str(e),
+                "byte_offset": e.offset,
+                "after_row": report["rows"],
+                "applied_through_row": applied_through_row,
+                "inserted": report["inserted"],
+                "updated": report["updated"]
+            }
+        )
+
+    if chunk:
+        await flush(chunk)
+
+    report["errors_truncated"] = report["failed"] > len(report["errors"])
+    return report
@@ -1,25 +1,58 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from .database import engine, Base
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from .database import engine, async_engine, writer_engine, Base
+from .passwords import password_hasher
+from .images import image_processor
+from .static import UploadFiles
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware, registry
+from .profiling import ProfilingMiddleware
+from .ratelimit import RateLimitMiddleware
+from .search import ensure_search_index
+from .changes import ensure_change_tracking
+from .analytics import ensure_order_stats
+from .writer import write_queue
+from .events import order_event_broker
 from .routers import (
     auth_router,
     admin_router,
     categories_router,
     products_router,
     orders_router,
-    settings_router
+    settings_router,
+    cart_router
 )
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+# Delta-sync change numbers: columns on tables from before them, and triggers
+ensure_change_tracking(engine)
+
+# create_all skips indexes on tables that already exist, so add any new ones
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
+
+# Full-text search index over products, kept in sync by triggers
+ensure_search_index(engine)
+
+# Dashboard rollups for databases that had orders before rollups existed
+ensure_order_stats(engine)
+
 app = FastAPI(
     title="KPG Shop API",
     description="Backend API for KPG Shop application",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson encodes the validated response models several times faster than json
+    default_response_class=ORJSONResponse
 )
 
+# Per-client token buckets and write-queue load shedding; added first so it
+# runs inside CORS and browsers can read its 429/503 responses
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS for Flutter web and mobile
 app.add_middleware(
     CORSMiddleware,
@@ -27,8 +60,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Order listings send their next-page cursor in headers
+    expose_headers=["X-Next-Cursor", "Link"],
 )
 
+# br/gzip for JSON bodies of 1 KB and more, negotiated per request
+app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+# X-Profile: 1 from an admin returns a profile of the request instead of its response
+app.add_middleware(ProfilingMiddleware)
+
+# Outermost, so latency includes compression and CORS handling
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api")
 app.include_router(admin_router, prefix="/api")
@@ -36,11 +80,21 @@ app.include_router(categories_router, prefix="/api")
 app.include_router(products_router, prefix="/api")
 app.include_router(orders_router, prefix="/api")
 app.include_router(settings_router, prefix="/api")
+app.include_router(cart_router, prefix="/api")
 
-# Mount static files for uploaded images
+@app.on_event("shutdown")
+async def shutdown():
+    password_hasher.shutdown()
+    image_processor.shutdown()
+    await order_event_broker.stop()
+    await write_queue.stop()
+    await async_engine.dispose()
+    await writer_engine.dispose()
+
+# Mount static files for uploaded images (immutable caching, ranges, variants)
 import os
 os.makedirs("uploads/products", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+app.mount("/uploads", UploadFiles(directory="uploads"), name="uploads")
 
 @app.get("/")
 def root():
@@ -53,3 +107,8 @@ def root():
 @app.get("/health")
 def health_check():
     return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition for this worker process"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
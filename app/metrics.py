@@ -0,0 +1,244 @@
+"""Request and SQL instrumentation, exposed in the Prometheus text format at /metrics.
+
+MetricsMiddleware times every HTTP request and labels it with the route
+template (/api/orders/{order_id}, not the concrete path) so the number of
+series stays bounded. SQLAlchemy cursor events on each engine count the
+statements a request runs and the time spent in them; the per-route
+queries-per-request histogram is where N+1 regressions show up. Statements
+slower than KPG_SLOW_QUERY_MS (default 100) are logged to "app.sql.slow".
+
+Every worker process keeps its own numbers; with several uvicorn workers
+each scrape sees the worker that happened to answer it.
+"""
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SLOW_QUERY_MS = float(os.getenv("KPG_SLOW_QUERY_MS", "100"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger("app.sql.slow")
+
+@dataclass
+class QueryStats:
+    """SQL executed on behalf of one request"""
+    scope: Scope = field(repr=False)
+    count: int = 0
+    seconds: float = 0.0
+    # (statement, seconds) of every query, kept only while profiling (see profiling.py)
+    statements: Optional[List[Tuple[str, float]]] = None
+
+    @property
+    def route(self) -> str:
+        # Routing fills in the scope before the endpoint runs, so this is
+        # already right for the endpoint's own queries
+        return _route_template(self.scope)
+
+_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the request being served, to hand to work that runs outside its task"""
+    return _query_stats.get()
+
+def use_query_stats(stats: Optional[QueryStats]):
+    """Attribute SQL run from here on to `stats`; returns a token for reset_query_stats"""
+    return _query_stats.set(stats)
+
+def reset_query_stats(token):
+    _query_stats.reset(token)
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+class Registry:
+    """Metric values for this process. Updated from the event loop thread only"""
+
+    def __init__(self):
+        self.request_seconds: Dict[Tuple[str, str], Histogram] = {}
+        self.requests_total: Dict[Tuple[str, str, str], int] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.queries_per_request: Dict[Tuple[str, str], Histogram] = {}
+        self.query_seconds_per_request: Dict[Tuple[str, str], Histogram] = {}
+        self.queries_total: Dict[str, int] = {}
+        self.query_seconds_total: Dict[str, float] = {}
+        self.slow_queries_total: Dict[str, int] = {}
+        self.rejected_total: Dict[Tuple[str, str], int] = {}
+
+    def _histogram(self, family: dict, key, buckets) -> Histogram:
+        histogram = family.get(key)
+        if histogram is None:
+            histogram = family[key] = Histogram(buckets)
+        return histogram
+
+    def request_started(self, method: str):
+        self.in_flight[method] = self.in_flight.get(method, 0) + 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float, stats: QueryStats):
+        self.in_flight[method] -= 1
+        key = (method, route)
+        self._histogram(self.request_seconds, key, LATENCY_BUCKETS).observe(seconds)
+        status_key = (method, route, str(status))
+        self.requests_total[status_key] = self.requests_total.get(status_key, 0) + 1
+        self._histogram(self.queries_per_request, key, QUERY_COUNT_BUCKETS).observe(stats.count)
+        self._histogram(self.query_seconds_per_request, key, LATENCY_BUCKETS).observe(stats.seconds)
+
+    def request_rejected(self, reason: str, budget: str):
+        key = (reason, budget)
+        self.rejected_total[key] = self.rejected_total.get(key, 0) + 1
+
+    def query_finished(self, route: str, seconds: float, slow: bool):
+        self.queries_total[route] = self.queries_total.get(route, 0) + 1
+        self.query_seconds_total[route] = self.query_seconds_total.get(route, 0.0) + seconds
+        if slow:
+            self.slow_queries_total[route] = self.slow_queries_total.get(route, 0) + 1
+
+    def render(self) -> str:
+        lines = []
+
+        def labels(**values):
+            return "{" + ",".join(
+                f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                for name, value in values.items()
+            ) + "}"
+
+        def histogram_family(name, help_text, family):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), histogram in sorted(family.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(float(bound))
+                    lines.append(f"{name}_bucket{labels(method=method, route=route, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{labels(method=method, route=route)} {histogram.sum}")
+                lines.append(f"{name}_count{labels(method=method, route=route)} {cumulative}")
+
+        def simple_family(name, kind, help_text, values, label_names):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append(f"{name}{labels(**dict(zip(label_names, key)))} {value}")
+
+        histogram_family(
+            "kpg_http_request_duration_seconds", "HTTP request latency by route.", self.request_seconds
+        )
+        simple_family(
+            "kpg_http_requests_total", "counter", "HTTP requests by route and status code.",
+            self.requests_total, ("method", "route", "status")
+        )
+        simple_family(
+            "kpg_http_requests_in_flight", "gauge", "HTTP requests currently being served.",
+            self.in_flight, ("method",)
+        )
+        simple_family(
+            "kpg_http_requests_rejected_total", "counter", "Requests refused by rate limits or load shedding.",
+            self.rejected_total, ("reason", "budget")
+        )
+        histogram_family(
+            "kpg_db_queries_per_request", "SQL statements executed per request.", self.queries_per_request
+        )
+        histogram_family(
+            "kpg_db_query_duration_per_request_seconds", "Time spent in SQL per request.",
+            self.query_seconds_per_request
+        )
+        simple_family(
+            "kpg_db_queries_total", "counter", "SQL statements executed, by the route that caused them.",
+            self.queries_total, ("route",)
+        )
+        simple_family(
+            "kpg_db_query_seconds_total", "counter", "Time spent in SQL, by the route that caused it.",
+            self.query_seconds_total, ("route",)
+        )
+        simple_family(
+            "kpg_db_slow_queries_total", "counter", f"SQL statements slower than {SLOW_QUERY_MS:g} ms.",
+            self.slow_queries_total, ("route",)
+        )
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _query_stats.get()
+    route = stats.route if stats is not None else "background"
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += seconds
+        if stats.statements is not None:
+            stats.statements.append((statement, seconds))
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+    registry.query_finished(route, seconds, slow)
+    if slow:
+        slow_query_logger.warning(
+            "slow query (%.1f ms) on %s: %s", seconds * 1000, route, " ".join(statement.split())[:500]
+        )
+
+def instrument_engine(engine: Engine):
+    """Count and time every statement executed on `engine` (pass async engines' .sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+def _route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps (the /uploads files) have an endpoint but no route; the
+    # mount point is their root_path
+    if scope.get("endpoint") is not None and scope.get("root_path"):
+        return scope["root_path"]
+    return "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # The route template is only known once routing has run, so the
+        # in-flight gauge is per method
+        method = scope["method"]
+        registry.request_started(method)
+        stats = QueryStats(scope)
+        token = _query_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # Shows DB time per request in browser dev tools and curl -v
+                message["headers"] = list(message.get("headers", [])) + [(
+                    b"server-timing",
+                    f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries"'.encode()
+                )]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _query_stats.reset(token)
+            registry.request_finished(method, stats.route, status_code, time.perf_counter() - started, stats)
@@ -4,5 +4,10 @@ from .product import Product
 from .customer import Customer
 from .order import Order, OrderItem
 from .settings import Settings
+from .analytics import OrderDailyStat
+from .counter import Counter
+from .event import OrderEvent
+from .tombstone import CatalogTombstone
+from .idempotency import IdempotencyKey
 
-__all__ = ["Admin", "Category", "Product", "Customer", "Order", "OrderItem", "Settings"]
+__all__ = ["Admin", "Category", "Product", "Customer", "Order", "OrderItem", "Settings", "OrderDailyStat", "Counter", "OrderEvent", "CatalogTombstone", "IdempotencyKey"]
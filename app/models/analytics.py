@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, String, Float, Date
+from ..database import Base
+
+class OrderDailyStat(Base):
+    """Per-day, per-status order rollup kept in step with the orders table"""
+    __tablename__ = "order_daily_stats"
+
+    day = Column(Date, primary_key=True)
+    status = Column(String(50), primary_key=True)
+    order_count = Column(Integer, default=0, nullable=False)
+    total_amount = Column(Float, default=0.0, nullable=False)
@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, String
+from ..database import Base
+
+class Counter(Base):
+    """Named monotonic counters shared by every worker through the database"""
+    __tablename__ = "counters"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(Integer, default=0, nullable=False)
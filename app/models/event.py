@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from datetime import datetime
+from ..database import Base
+
+class OrderEvent(Base):
+    """Committed order changes, in commit order, for the /orders/events feed"""
+    __tablename__ = "order_events"
+    # AUTOINCREMENT: ids are never reused after old events are pruned, so a
+    # client's Last-Event-ID always means the same event
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    event_type = Column(String(50), nullable=False)
+    order_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON, sent as the SSE data line
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
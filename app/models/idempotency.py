@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from datetime import datetime
+from ..database import Base
+
+class IdempotencyKey(Base):
+    """Stored outcome of a POST /orders sent with an Idempotency-Key header"""
+    __tablename__ = "idempotency_keys"
+
+    customer_id = Column(Integer, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)  # sha256 of the request body
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
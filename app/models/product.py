@@ -8,13 +8,16 @@ class Product(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
-    name = Column(String(200), nullable=False)
+    name = Column(String(200), nullable=False, index=True)
     price = Column(Float, nullable=False)
     stock = Column(Integer, default=0, nullable=False)
     is_available = Column(Boolean, default=True, nullable=False)
     image_path = Column(String(500), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Commit-ordered change number for delta sync (/products/changes), set by
+    # triggers on every insert and update; see changes.py
+    change_seq = Column(Integer, nullable=True, index=True)
 
     # Relationships
     category = relationship("Category")
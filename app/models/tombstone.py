@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from ..database import Base
+
+class CatalogTombstone(Base):
+    """Deleted products and categories, so delta-syncing clients can drop them"""
+    __tablename__ = "catalog_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    entity = Column(String(20), nullable=False)  # "product" or "category"
+    entity_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    change_seq = Column(Integer, nullable=True, index=True)  # set by a trigger, see changes.py
@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# Each bcrypt call costs ~250 ms of CPU, so keep the pool small and the
+# queue short: beyond max_pending callers get a 429 instead of waiting
+PASSWORD_WORKERS = 2
+PASSWORD_MAX_PENDING = 8
+# Hashing yields the CPU to the request loop whenever both want it; on
+# machines with fewer cores than workers + 1 that is what keeps other
+# endpoints responsive during a login burst
+PASSWORD_NICENESS = 10
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def _lower_priority():
+    try:
+        os.nice(PASSWORD_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated process pool, off the shared request threadpool"""
+
+    def __init__(self, workers: int = PASSWORD_WORKERS, max_pending: int = PASSWORD_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        # Created lazily so scripts importing the app never spawn workers
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority
+            )
+        return self._pool
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many concurrent password operations, retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+password_hasher = PasswordHasher()
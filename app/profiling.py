@@ -0,0 +1,185 @@
+"""On-demand profiling of a single request, for admins.
+
+Send `X-Profile: 1` (or add `?_profile=1`) with an admin bearer token and,
+instead of the normal response, get where the request spent its time:
+
+    curl -H "Authorization: Bearer $ADMIN_TOKEN" -H "X-Profile: 1" \
+        http://localhost:8000/api/admin/analytics
+
+A sampler thread looks at the event loop thread every SAMPLE_INTERVAL
+seconds. While the request's own task is running, the sample is its Python
+stack; while the task is suspended (waiting for SQLite, the threadpool, the
+write queue...), the sample is the chain of coroutines it is awaiting,
+under a "(waiting)" root. The JSON result holds these in collapsed-stack
+format, one "frame;frame;frame count" line per distinct stack, ready for
+flamegraph.pl or speedscope, plus every SQL statement the request ran.
+`X-Profile: collapsed` returns just the collapsed stacks as text.
+
+The sampler needs the GIL to take a sample, so while the handler is busy on
+the CPU, samples come at most every sys.getswitchinterval() (5 ms); waits
+are sampled at the full rate.
+
+Requests without the flag only pay for a header scan.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials
+from starlette.datastructures import Headers, QueryParams
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from .auth import get_current_admin
+from .database import AsyncSessionLocal
+from .metrics import current_query_stats
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_PARAM = "_profile"
+SAMPLE_INTERVAL = float(os.getenv("KPG_PROFILE_INTERVAL_MS", "1")) / 1000
+MAX_SQL_STATEMENTS = 500
+
+def _frame_label(code) -> str:
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)})"
+
+def _running_stack(frame) -> List[str]:
+    """Labels from the task's entry point down to `frame`, event loop frames dropped"""
+    labels = []
+    while frame is not None:
+        if frame.f_code.co_filename.endswith(os.path.join("asyncio", "events.py")):
+            break
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+def _awaiting_stack(coro) -> List[str]:
+    """Labels of the coroutine chain a suspended task is parked in"""
+    labels = ["(waiting)"]
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        labels.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    if coro is not None:
+        # What the innermost coroutine is waiting on: a Future, a lock...
+        labels.append(type(coro).__name__)
+    return labels
+
+class Sampler:
+    """Samples one asyncio task from a background thread"""
+
+    def __init__(self, task: asyncio.Task, loop_thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.task = task
+        self.loop = task.get_loop()
+        self.loop_thread_id = loop_thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    async def stop(self):
+        self._stop.set()
+        # The thread may be mid-sample; wait for it without blocking the loop
+        await asyncio.to_thread(self._thread.join)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if asyncio.current_task(self.loop) is self.task:
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = _running_stack(frame)
+            else:
+                stack = _awaiting_stack(self.task.get_coro())
+            if stack:
+                self.stacks[";".join(stack)] += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+def _wants_profile(scope: Scope) -> bool:
+    if any(name == PROFILE_HEADER for name, _ in scope["headers"]):
+        return True
+    query_string = scope.get("query_string", b"")
+    # Parse only when the name appears at all; it may be part of another value
+    return PROFILE_PARAM.encode() in query_string and PROFILE_PARAM in QueryParams(query_string)
+
+async def _check_admin(scope: Scope):
+    """Same check as the get_current_admin dependency; raises HTTPException"""
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=403, detail="Profiling requires an admin token")
+    async with AsyncSessionLocal() as db:
+        await get_current_admin(HTTPAuthorizationCredentials(scheme=scheme, credentials=token), db)
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await _check_admin(scope)
+        except HTTPException as exc:
+            response = ORJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+            await response(scope, receive, send)
+            return
+
+        stats = current_query_stats()
+        if stats is not None:
+            stats.statements = []
+        response_status = 500
+        response_bytes = 0
+
+        async def discard(message: Message):
+            # The profile replaces the response, so the real one is only measured
+            nonlocal response_status, response_bytes
+            if message["type"] == "http.response.start":
+                response_status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+
+        sampler = Sampler(asyncio.current_task(), threading.get_ident())
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            elapsed = time.perf_counter() - started
+            await sampler.stop()
+        statements = stats.statements if stats is not None else []
+        if stats is not None:
+            stats.statements = None
+
+        if Headers(scope=scope).get("x-profile") == "collapsed":
+            await PlainTextResponse(sampler.collapsed())(scope, receive, send)
+            return
+
+        result = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": response_status,
+            "response_bytes": response_bytes,
+            "duration_ms": round(elapsed * 1000, 2),
+            "sample_interval_ms": SAMPLE_INTERVAL * 1000,
+            "samples": sum(sampler.stacks.values()),
+            "collapsed": sampler.collapsed(),
+            "sql": {
+                "count": len(statements),
+                "duration_ms": round(sum(seconds for _, seconds in statements) * 1000, 2),
+                "statements": [
+                    {"sql": " ".join(statement.split()), "duration_ms": round(seconds * 1000, 3)}
+                    for statement, seconds in statements[:MAX_SQL_STATEMENTS]
+                ],
+            },
+        }
+        await ORJSONResponse(result)(scope, receive, send)
@@ -0,0 +1,118 @@
+"""Server-side cart pricing, and signed quotes that create_order can reuse.
+
+POST /cart/quote prices a whole cart from one IN query on products plus the
+current discount, and reports stock per line; the subtotal and total cover
+the lines that can be ordered as they stand. When every line can be
+ordered the response carries a quote token: the priced lines and total,
+signed with the API's JWT key and valid for QUOTE_TTL. An order placed with
+that token takes its prices and total from the quote instead of trusting
+the amounts the client sends; stock is still reserved when the order is
+placed.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List
+from fastapi import HTTPException, status
+from jose import JWTError, jwt
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .auth import ALGORITHM, SECRET_KEY
+from .models import Product
+from .schemas import CartLine, OrderCreate
+from .settings_registry import settings_registry, DISCOUNT_PERCENTAGE
+
+QUOTE_TTL = timedelta(minutes=15)
+
+def _merge_lines(lines) -> Dict[int, int]:
+    """Quantity per product (cart lines or order items), in first-seen order"""
+    quantities = {}
+    for line in lines:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+    return quantities
+
+async def build_quote(db: AsyncSession, lines: List[CartLine]) -> dict:
+    quantities = _merge_lines(lines)
+    products = {
+        product.id: product
+        for product in await db.scalars(select(Product).where(Product.id.in_(quantities)))
+    }
+    discount = await settings_registry.get(DISCOUNT_PERCENTAGE)
+
+    items = []
+    subtotal = 0.0
+    orderable = True
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            items.append({"product_id": product_id, "quantity": quantity, "stock_status": "not_found"})
+            orderable = False
+            continue
+
+        line_total = round(product.price * quantity, 2)
+        if quantity <= 0:
+            stock_status = "invalid_quantity"
+        elif not product.is_available:
+            stock_status = "unavailable"
+        elif product.stock < quantity:
+            stock_status = "insufficient_stock"
+        else:
+            stock_status = "ok"
+            subtotal += line_total
+        orderable = orderable and stock_status == "ok"
+        items.append({
+            "product_id": product_id,
+            "product_name": product.name,
+            "quantity": quantity,
+            "unit_price": product.price,
+            "line_total": line_total,
+            "stock_status": stock_status,
+            "available_stock": max(product.stock, 0)
+        })
+
+    subtotal = round(subtotal, 2)
+    discount_amount = round(subtotal * discount / 100, 2)
+    quote = {
+        "items": items,
+        "subtotal": subtotal,
+        "discount_percentage": discount,
+        "discount_amount": discount_amount,
+        "total": round(subtotal - discount_amount, 2),
+        "orderable": orderable,
+        "quote_token": None,
+        "expires_at": None
+    }
+    if orderable:
+        expires_at = datetime.utcnow() + QUOTE_TTL
+        quote["quote_token"] = jwt.encode({
+            "type": "quote",
+            "items": [[item["product_id"], item["quantity"], item["unit_price"], item["product_name"]] for item in items],
+            "total": quote["total"],
+            "exp": expires_at
+        }, SECRET_KEY, algorithm=ALGORITHM)
+        quote["expires_at"] = expires_at
+    return quote
+
+def apply_quote(order: OrderCreate) -> OrderCreate:
+    """`order` with prices, names and total taken from its quote token"""
+    try:
+        claims = jwt.decode(order.quote_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        claims = {}
+    if claims.get("type") != "quote":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid or expired quote, request a new one"
+        )
+
+    quoted = {product_id: (quantity, price, name) for product_id, quantity, price, name in claims["items"]}
+    requested = _merge_lines(order.items)
+    if requested != {product_id: line[0] for product_id, line in quoted.items()}:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Order items do not match the quote"
+        )
+
+    items = [
+        item.model_copy(update={"price_at_order": quoted[item.product_id][1], "product_name": quoted[item.product_id][2]})
+        for item in order.items
+    ]
+    return order.model_copy(update={"items": items, "total_amount": claims["total"]})
@@ -0,0 +1,210 @@
+"""Per-client rate limits and load shedding for /api routes.
+
+Each client gets a token bucket per budget: a burst allowance that refills
+at a steady rate. Clients are identified by the customer or admin id in
+their bearer token (verified, so a forged token can't mint fresh buckets)
+or else by IP address. Behind a reverse proxy the connecting address is the
+proxy's, so list the proxies in KPG_TRUSTED_PROXIES: for requests from them
+the client is the rightmost X-Forwarded-For address that isn't itself a
+trusted proxy. Requests over budget get 429 with Retry-After.
+Buckets live in an LRU capped at MAX_BUCKETS, so memory stays bounded and
+every check is O(1); an evicted client simply starts again with a full
+bucket.
+
+Load shedding protects the single SQLite writer. While the oldest job in
+the write queue has been waiting longer than SHED_WRITE_WAIT seconds, new
+writes are refused with 503 and a Retry-After based on that wait, instead of
+piling onto a queue that is already late. Independently, once SHED_IN_FLIGHT
+/api requests are in progress, new ones get 503; long-lived event streams
+don't count toward that. Shedding is checked before the client's bucket,
+so a shed request costs no token.
+
+Set KPG_RATE_LIMIT=off to disable the per-client limits (the benchmarks do);
+load shedding stays on.
+"""
+import ipaddress
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
+from fastapi.responses import ORJSONResponse
+from jose import JWTError, jwt
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from .auth import ALGORITHM, SECRET_KEY
+from .metrics import registry
+from .writer import write_queue
+
+RATE_LIMIT_ENABLED = os.getenv("KPG_RATE_LIMIT", "on").lower() not in ("0", "off", "false", "no")
+MAX_BUCKETS = int(os.getenv("KPG_RATE_LIMIT_MAX_BUCKETS", "100000"))
+SHED_WRITE_WAIT = float(os.getenv("KPG_SHED_WRITE_WAIT_MS", "1000")) / 1000
+SHED_IN_FLIGHT = int(os.getenv("KPG_SHED_IN_FLIGHT", "512"))
+# Comma-separated addresses or networks, e.g. "127.0.0.1,10.0.0.0/8"
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(network.strip(), strict=False)
+    for network in os.getenv("KPG_TRUSTED_PROXIES", "").split(",")
+    if network.strip()
+]
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+# Server-sent event streams stay open for hours but sit idle between events;
+# counting them would let a few hundred dashboards shed the whole API
+STREAMING = [("GET", re.compile(r"^/api/orders/events$"))]
+
+@dataclass(frozen=True)
+class Budget:
+    name: str
+    rate: float  # requests per second, sustained
+    burst: int
+
+# First match wins; paths outside /api are not limited
+BUDGETS = [
+    # Customer login also signs up, i.e. writes; admin login runs bcrypt
+    ("POST", re.compile(r"^/api/auth/customer/login$"), Budget("customer_login", 10 / 60, 10)),
+    ("POST", re.compile(r"^/api/auth/admin/login$"), Budget("admin_login", 5 / 60, 5)),
+    ("POST", re.compile(r"^/api/orders$"), Budget("place_order", 0.5, 10)),
+    ("GET", re.compile(r"^/api/orders$"), Budget("list_orders", 1.0, 10)),
+    ("POST", re.compile(r"^/api/products/import$"), Budget("import", 0.1, 3)),
+    (None, re.compile(r"^/api/"), Budget("api", 20.0, 60)),
+]
+
+def match_budget(method: str, path: str) -> Optional[Budget]:
+    for budget_method, pattern, budget in BUDGETS:
+        if (budget_method is None or budget_method == method) and pattern.match(path):
+            return budget
+    return None
+
+@lru_cache(maxsize=4096)
+def is_streaming(method: str, path: str) -> bool:
+    return any(method == stream_method and pattern.match(path) for stream_method, pattern in STREAMING)
+
+def _principal_key(token: str) -> Optional[str]:
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if not payload.get("type") or not payload.get("sub"):
+        return None
+    return f"{payload['type']}:{payload['sub']}"
+
+@lru_cache(maxsize=4096)
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+def client_address(scope: Scope, headers: Headers) -> str:
+    client = scope.get("client")
+    address = client[0] if client else "unknown"
+    if not TRUSTED_PROXIES or not _is_trusted_proxy(address):
+        return address
+    hops = [
+        hop.strip()
+        for value in headers.getlist("x-forwarded-for")
+        for hop in value.split(",")
+        if hop.strip()
+    ]
+    # Proxies append the address they saw, so read from the right and stop at
+    # the first one no trusted proxy vouches for; anything further left is
+    # whatever the client chose to send
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+        address = hop
+    return address
+
+def client_key(scope: Scope) -> str:
+    headers = Headers(scope=scope)
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        key = _principal_key(token)
+        if key is not None:
+            return key
+    return f"ip:{client_address(scope, headers)}"
+
+class TokenBuckets:
+    """(budget, client) -> (tokens, last refill), least recently used first"""
+
+    def __init__(self, max_buckets: int = MAX_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+
+    def take(self, budget: Budget, client: str, now: float) -> Tuple[bool, float]:
+        """Spend one token; returns (allowed, seconds until the next token)"""
+        slot = (budget.name, client)
+        entry = self._buckets.get(slot)
+        if entry is None:
+            tokens = float(budget.burst)
+        else:
+            tokens = min(float(budget.burst), entry[0] + (now - entry[1]) * budget.rate)
+            self._buckets.move_to_end(slot)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[slot] = (tokens, now)
+        if len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / budget.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+def _reject(status_code: int, detail: str, retry_after: float) -> ORJSONResponse:
+    return ORJSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.enabled = enabled
+        self.buckets = TokenBuckets()
+        self.in_flight = 0
+
+    def _check(self, scope: Scope, budget: Budget, streaming: bool) -> Optional[ORJSONResponse]:
+        # Shed first, so that a refused request doesn't also spend a token
+        if scope["method"] not in READ_METHODS and write_queue.wait_seconds > SHED_WRITE_WAIT:
+            registry.request_rejected("shed_writes", budget.name)
+            return _reject(503, "Server busy, try again shortly", write_queue.wait_seconds)
+        if not streaming and self.in_flight >= SHED_IN_FLIGHT:
+            registry.request_rejected("shed_in_flight", budget.name)
+            return _reject(503, "Server busy, try again shortly", 1)
+
+        if self.enabled:
+            allowed, retry_after = self.buckets.take(budget, client_key(scope), time.monotonic())
+            if not allowed:
+                registry.request_rejected("rate_limited", budget.name)
+                return _reject(429, "Too many requests", retry_after)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        budget = match_budget(scope["method"], scope["path"])
+        if budget is None:
+            await self.app(scope, receive, send)
+            return
+
+        streaming = is_streaming(scope["method"], scope["path"])
+        rejection = self._check(scope, budget, streaming)
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+
+        if streaming:
+            await self.app(scope, receive, send)
+            return
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
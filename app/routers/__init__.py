@@ -4,6 +4,7 @@ from .categories import router as categories_router
 from .products import router as products_router
 from .orders import router as orders_router
 from .settings import router as settings_router
+from .cart import router as cart_router
 
 __all__ = [
     "auth_router",
@@ -11,5 +12,6 @@ __all__ = [
     "categories_router",
     "products_router",
     "orders_router",
-    "settings_router"
+    "settings_router",
+    "cart_router"
 ]
@@ -1,16 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from ..database import get_db
-from ..models import Order, Product, Admin
-from ..auth import get_current_admin, get_password_hash, verify_password
+from ..models import Admin
+from ..analytics import get_summary
+from ..auth import get_current_admin, password_hasher, principal_cache
+from ..writer import write_queue
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
 @router.get("/me")
-def get_current_admin_info(admin: Admin = Depends(get_current_admin)):
+async def get_current_admin_info(admin: Admin = Depends(get_current_admin)):
     return {
         "id": admin.id,
         "phone": admin.phone,
@@ -18,46 +19,16 @@ def get_current_admin_info(admin: Admin = Depends(get_current_admin)):
     }
 
 @router.get("/analytics")
-def get_analytics(
-    db: Session = Depends(get_db),
+async def get_analytics(
+    db: AsyncSession = Depends(get_db),
     admin: Admin = Depends(get_current_admin)
 ):
-    # Total revenue (delivered orders only)
-    total_revenue = db.query(func.sum(Order.total_amount)).filter(
-        Order.status == "DELIVERED"
-    ).scalar() or 0.0
-    
-    # Today's revenue
-    today = datetime.utcnow().date()
-    today_revenue = db.query(func.sum(Order.total_amount)).filter(
-        Order.status == "DELIVERED",
-        func.date(Order.created_at) == today
-    ).scalar() or 0.0
-    
-    # Total orders
-    total_orders = db.query(func.count(Order.id)).scalar() or 0
-    
-    # Pending orders
-    pending_orders = db.query(func.count(Order.id)).filter(
-        Order.status == "PENDING"
-    ).scalar() or 0
-    
-    # Total products
-    total_products = db.query(func.count(Product.id)).scalar() or 0
-    
-    # Low stock products (stock < 10)
-    low_stock_products = db.query(func.count(Product.id)).filter(
-        Product.stock < 10
-    ).scalar() or 0
-    
-    return {
-        "total_revenue": total_revenue,
-        "today_revenue": today_revenue,
-        "total_orders": total_orders,
-        "pending_orders": pending_orders,
-        "total_products": total_products,
-        "low_stock_products": low_stock_products
-    }
+    return await get_summary(db)
+
+@router.get("/auth-cache")
+async def get_auth_cache_stats(admin: Admin = Depends(get_current_admin)):
+    """Hit/miss counters for the token and principal cache"""
+    return principal_cache.stats()
 
 # Request models
 class UpdatePhoneRequest(BaseModel):
@@ -67,18 +38,12 @@ class UpdatePasswordRequest(BaseModel):
     old_password: str
     new_password: str
 
-@router.put("/update-phone")
-def update_admin_phone(
-    request: UpdatePhoneRequest,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
-    """Update admin phone number"""
-    # Check if phone already exists
-    existing_admin = db.query(Admin).filter(
-        Admin.phone == request.new_phone,
-        Admin.id != admin.id
-    ).first()
+async def _set_admin_phone(db: AsyncSession, admin_id: int, new_phone: str):
+    # Check if phone already exists, inside the write so two admins can't race to it
+    existing_admin = await db.scalar(select(Admin).where(
+        Admin.phone == new_phone,
+        Admin.id != admin_id
+    ))
     
     if existing_admin:
         raise HTTPException(
@@ -86,25 +51,33 @@ def update_admin_phone(
             detail="Phone number already in use"
         )
     
-    # Update phone
-    admin.phone = request.new_phone
-    db.commit()
-    db.refresh(admin)
+    await db.execute(update(Admin).where(Admin.id == admin_id).values(phone=new_phone))
+
+async def _set_admin_password_hash(db: AsyncSession, admin_id: int, password_hash: str):
+    await db.execute(update(Admin).where(Admin.id == admin_id).values(password_hash=password_hash))
+
+@router.put("/update-phone")
+async def update_admin_phone(
+    request: UpdatePhoneRequest,
+    admin: Admin = Depends(get_current_admin)
+):
+    """Update admin phone number"""
+    await write_queue.submit(lambda db: _set_admin_phone(db, admin.id, request.new_phone))
+    principal_cache.invalidate("admin", admin.id)
     
     return {
         "message": "Phone number updated successfully",
-        "phone": admin.phone
+        "phone": request.new_phone
     }
 
 @router.put("/update-password")
-def update_admin_password(
+async def update_admin_password(
     request: UpdatePasswordRequest,
-    db: Session = Depends(get_db),
     admin: Admin = Depends(get_current_admin)
 ):
     """Update admin password"""
     # Verify old password
-    if not verify_password(request.old_password, admin.password_hash):
+    if not await password_hasher.verify(request.old_password, admin.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
@@ -117,8 +90,9 @@ def update_admin_password(
             detail="New password must be at least 6 characters"
         )
     
-    # Update password
-    admin.password_hash = get_password_hash(request.new_password)
-    db.commit()
+    # Hash before queueing: bcrypt must not hold up the writer
+    password_hash = await password_hasher.hash(request.new_password)
+    await write_queue.submit(lambda db: _set_admin_password_hash(db, admin.id, password_hash))
+    principal_cache.invalidate("admin", admin.id)
     
     return {"message": "Password updated successfully"}
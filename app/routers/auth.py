@@ -1,17 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from ..database import get_db
 from ..models import Admin, Customer
 from ..schemas import AdminLogin, CustomerLogin, TokenResponse
-from ..auth import verify_password, create_access_token
+from ..auth import create_access_token, password_hasher
+from ..writer import write_queue
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+async def _register_customer(db: AsyncSession, credentials: CustomerLogin) -> Customer:
+    # Re-check inside the write transaction in case of a concurrent first login
+    customer = await db.scalar(select(Customer).where(Customer.phone == credentials.phone))
+    if not customer:
+        customer = Customer(
+            phone=credentials.phone,
+            name=credentials.name
+        )
+        db.add(customer)
+        await db.flush()
+    return customer
+
 @router.post("/admin/login", response_model=TokenResponse)
-def admin_login(credentials: AdminLogin, db: Session = Depends(get_db)):
-    admin = db.query(Admin).filter(Admin.phone == credentials.phone).first()
+async def admin_login(credentials: AdminLogin, db: AsyncSession = Depends(get_db)):
+    admin = await db.scalar(select(Admin).where(Admin.phone == credentials.phone))
     
-    if not admin or not verify_password(credentials.password, admin.password_hash):
+    if not admin or not await password_hasher.verify(credentials.password, admin.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect phone number or password"
@@ -33,19 +47,13 @@ def admin_login(credentials: AdminLogin, db: Session = Depends(get_db)):
     }
 
 @router.post("/customer/login", response_model=TokenResponse)
-def customer_login(credentials: CustomerLogin, db: Session = Depends(get_db)):
+async def customer_login(credentials: CustomerLogin, db: AsyncSession = Depends(get_db)):
     # Check if customer exists
-    customer = db.query(Customer).filter(Customer.phone == credentials.phone).first()
+    customer = await db.scalar(select(Customer).where(Customer.phone == credentials.phone))
     
     # If not, create new customer (auto-register)
     if not customer:
-        customer = Customer(
-            phone=credentials.phone,
-            name=credentials.name
-        )
-        db.add(customer)
-        db.commit()
-        db.refresh(customer)
+        customer = await write_queue.submit(lambda writer_db: _register_customer(writer_db, credentials))
     
     access_token = create_access_token(
         data={"sub": str(customer.id), "type": "customer"}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import get_db
+from ..schemas import CartQuoteRequest, CartQuote
+from ..quotes import build_quote
+
+router = APIRouter(prefix="/cart", tags=["Cart"])
+
+@router.post("/quote", response_model=CartQuote)
+async def quote_cart(cart: CartQuoteRequest, db: AsyncSession = Depends(get_db)):
+    """Current prices, stock and discounted total for a whole cart in one call"""
+    return await build_quote(db, cart.items)
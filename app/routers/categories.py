@@ -1,26 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 from ..database import get_db
 from ..models import Category, Admin
 from ..schemas import CategoryCreate, CategoryUpdate, CategoryResponse
 from ..auth import get_current_admin
+from ..catalog_cache import cached_catalog_response, bump_catalog_version
+from ..changes import record_tombstone
+from ..writer import write_queue
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
 @router.get("", response_model=List[CategoryResponse])
-def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(Category).all()
-    return categories
+async def get_categories(request: Request, db: AsyncSession = Depends(get_db)):
+    async def load():
+        return (await db.scalars(select(Category))).all()
+    
+    return await cached_catalog_response(
+        request, db, ("categories",), CategoryResponse, load
+    )
 
-@router.post("", response_model=CategoryResponse)
-def create_category(
-    category: CategoryCreate,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
+async def _create_category(db: AsyncSession, category: CategoryCreate) -> Category:
     # Check if category already exists
-    existing = db.query(Category).filter(Category.name == category.name).first()
+    existing = await db.scalar(select(Category).where(Category.name == category.name))
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -29,18 +32,12 @@ def create_category(
     
     db_category = Category(**category.dict())
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.flush()
+    await bump_catalog_version(db)
     return db_category
 
-@router.put("/{category_id}", response_model=CategoryResponse)
-def update_category(
-    category_id: int,
-    category: CategoryUpdate,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
-    db_category = db.query(Category).filter(Category.id == category_id).first()
+async def _update_category(db: AsyncSession, category_id: int, category: CategoryUpdate) -> Category:
+    db_category = await db.get(Category, category_id)
     if not db_category:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -48,23 +45,41 @@ def update_category(
         )
     
     db_category.name = category.name
-    db.commit()
-    db.refresh(db_category)
+    await db.flush()
+    await bump_catalog_version(db)
     return db_category
 
-@router.delete("/{category_id}")
-def delete_category(
-    category_id: int,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
-    db_category = db.query(Category).filter(Category.id == category_id).first()
+async def _delete_category(db: AsyncSession, category_id: int):
+    db_category = await db.get(Category, category_id)
     if not db_category:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Category not found"
         )
     
-    db.delete(db_category)
-    db.commit()
+    await db.delete(db_category)
+    await record_tombstone(db, "category", category_id)
+    await bump_catalog_version(db)
+
+@router.post("", response_model=CategoryResponse)
+async def create_category(
+    category: CategoryCreate,
+    admin: Admin = Depends(get_current_admin)
+):
+    return await write_queue.submit(lambda db: _create_category(db, category))
+
+@router.put("/{category_id}", response_model=CategoryResponse)
+async def update_category(
+    category_id: int,
+    category: CategoryUpdate,
+    admin: Admin = Depends(get_current_admin)
+):
+    return await write_queue.submit(lambda db: _update_category(db, category_id, category))
+
+@router.delete("/{category_id}")
+async def delete_category(
+    category_id: int,
+    admin: Admin = Depends(get_current_admin)
+):
+    await write_queue.submit(lambda db: _delete_category(db, category_id))
     return {"message": "Category deleted successfully"}
@@ -1,21 +1,176 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
-from datetime import datetime, timedelta
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select, and_, or_, case, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import List, Optional
+from datetime import datetime
+import base64
 from ..database import get_db
 from ..models import Order, OrderItem, Product, Admin, Customer
 from ..schemas import OrderCreate, OrderUpdate, OrderResponse
 from ..auth import get_current_admin, get_current_customer
+from ..analytics import record_order_created, record_status_change
+from ..catalog_cache import bump_catalog_version, bump_stock_version
+from ..writer import write_queue
+from ..exports import stream_orders
+from ..quotes import apply_quote
+from ..idempotency import StoredResponse, request_fingerprint, submit_once
+from ..events import (
+    ORDER_CREATED, ORDER_STATUS_CHANGED, order_event_broker, order_event_stream, record_order_event
+)
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
-@router.post("", response_model=OrderResponse)
-def create_order(
-    order: OrderCreate,
-    db: Session = Depends(get_db),
-    customer: Customer = Depends(get_current_customer)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _encode_cursor(order: Order) -> str:
+    raw = f"{order.created_at.isoformat()}|{order.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, order_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+def _filter_orders(
+    query,
+    order_status: Optional[str],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime]
 ):
+    if order_status:
+        query = query.where(Order.status == order_status)
+    if created_from:
+        query = query.where(Order.created_at >= created_from)
+    if created_to:
+        query = query.where(Order.created_at < created_to)
+    return query
+
+async def _paginate_orders(
+    request: Request,
+    response: Response,
+    db: AsyncSession,
+    query,
+    limit: int,
+    cursor: Optional[str],
+    order_status: Optional[str],
+    created_from: Optional[datetime],
+    created_to: Optional[datetime]
+) -> dict:
+    """Fetch one page of orders newest first, keyed on (created_at, id).
+
+    The body stays a plain list; when there is another page its cursor goes
+    out in X-Next-Cursor and as a Link rel="next" URL.
+    """
+    query = _filter_orders(query, order_status, created_from, created_to)
+    
+    if cursor:
+        cursor_created_at, cursor_id = _decode_cursor(cursor)
+        query = query.where(or_(
+            Order.created_at < cursor_created_at,
+            and_(Order.created_at == cursor_created_at, Order.id < cursor_id)
+        ))
+    
+    # Fetch one extra row to know whether another page exists;
+    # items for the whole page come back in a single IN query
+    orders = (await db.scalars(
+        query.options(selectinload(Order.items))
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(limit + 1)
+    )).all()
+    
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = _encode_cursor(orders[-1])
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    
+    return orders
+
+async def _reserve_stock(db: AsyncSession, items) -> bool:
+    """Decrement stock for every cart line or fail the whole order.
+
+    Products are fetched in one IN query and each decrement is a conditional
+    UPDATE, so concurrent checkouts can never drive stock below zero.
+    Returns whether any product sold out (and so became unavailable).
+    """
+    requested = {}
+    for item in items:
+        requested[item.product_id] = requested.get(item.product_id, 0) + item.quantity
+    
+    products = {
+        product.id: product
+        for product in await db.scalars(select(Product).where(Product.id.in_(requested)))
+    }
+    
+    errors = []
+    sold_out = False
+    for item in items:
+        if item.quantity <= 0:
+            errors.append({
+                "product_id": item.product_id,
+                "error": "Quantity must be greater than zero"
+            })
+        elif item.product_id not in products:
+            errors.append({
+                "product_id": item.product_id,
+                "error": "Product not found"
+            })
+    
+    if not errors:
+        for product_id, quantity in requested.items():
+            result = await db.execute(
+                update(Product)
+                .where(Product.id == product_id, Product.stock >= quantity)
+                .values(
+                    stock=Product.stock - quantity,
+                    is_available=case(
+                        (Product.stock - quantity <= 0, False),
+                        else_=Product.is_available
+                    )
+                )
+                .returning(Product.stock)
+                .execution_options(synchronize_session=False)
+            )
+            remaining = result.scalar()
+            if remaining is None:
+                # The stock read above may already be stale by now
+                available = await db.scalar(select(Product.stock).where(Product.id == product_id))
+                errors.append({
+                    "product_id": product_id,
+                    "error": "Insufficient stock",
+                    "requested": quantity,
+                    "available": max(available or 0, 0)
+                })
+            elif remaining <= 0:
+                sold_out = True
+    
+    # Raising rolls back this job's savepoint in the write queue
+    if errors:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": "Some items could not be reserved", "items": errors}
+        )
+    return sold_out
+
+async def _place_order(db: AsyncSession, order: OrderCreate) -> Order:
+    if order.quote_token:
+        # Prices and total from the signed quote, not from the client. Checked
+        # here rather than up front so that an idempotent retry replays the
+        # stored order even after its quote expired
+        order = apply_quote(order)
+    
+    # Reserve stock first so a shortfall fails before anything is inserted
+    sold_out = await _reserve_stock(db, order.items)
+    
     # Create order
     db_order = Order(
         customer_id=order.customer_id,
@@ -25,45 +180,84 @@ def create_order(
         total_amount=order.total_amount,
         payment_mode=order.payment_mode,
         note=order.note,
-        status="PENDING"
+        status="PENDING",
+        items=[
+            OrderItem(
+                product_id=item.product_id,
+                product_name=item.product_name,
+                quantity=item.quantity,
+                price_at_order=item.price_at_order
+            )
+            for item in order.items
+        ]
     )
     db.add(db_order)
-    db.flush()  # Get the order ID
-    
-    # Create order items
-    for item in order.items:
-        db_item = OrderItem(
-            order_id=db_order.id,
-            product_id=item.product_id,
-            product_name=item.product_name,
-            quantity=item.quantity,
-            price_at_order=item.price_at_order
+    await db.flush()
+    
+    await record_order_created(db, db_order)
+    await record_order_event(db, ORDER_CREATED, db_order)
+    if sold_out:
+        # Availability is what catalog lists filter on: drop them right away
+        await bump_catalog_version(db)
+    else:
+        # Only the stock numbers moved; cached lists refresh within
+        # STOCK_MAX_AGE instead of being thrown away on every checkout
+        await bump_stock_version(db)
+    return db_order
+
+@router.post("", response_model=OrderResponse)
+async def create_order(
+    order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    customer: Customer = Depends(get_current_customer)
+):
+    if idempotency_key is None:
+        db_order = await write_queue.submit(lambda db: _place_order(db, order))
+    else:
+        db_order = await submit_once(
+            customer.id, idempotency_key, request_fingerprint(order),
+            lambda db: _place_order(db, order),
+            lambda placed: OrderResponse.model_validate(placed).model_dump_json()
         )
-        db.add(db_item)
-        
-        # Update product stock
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            product.stock -= item.quantity
-            if product.stock <= 0:
-                product.is_available = False
-    
-    db.commit()
-    db.refresh(db_order)
+        if isinstance(db_order, StoredResponse):
+            # A retry of an order that was already placed
+            return Response(
+                content=db_order.body,
+                status_code=db_order.status_code,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"}
+            )
+    
+    order_event_broker.notify()
     return db_order
 
 @router.get("", response_model=List[OrderResponse])
-def get_orders(
-    db: Session = Depends(get_db),
+async def get_orders(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    order_status: Optional[str] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
     admin: Admin = Depends(get_current_admin)
 ):
-    orders = db.query(Order).order_by(Order.created_at.desc()).all()
-    return orders
+    return await _paginate_orders(
+        request, response, db, select(Order), limit, cursor, order_status, created_from, created_to
+    )
 
 @router.get("/customer/{customer_id}", response_model=List[OrderResponse])
-def get_customer_orders(
+async def get_customer_orders(
     customer_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    order_status: Optional[str] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_db),
     customer: Customer = Depends(get_current_customer)
 ):
     # Ensure customer can only access their own orders
@@ -73,14 +267,64 @@ def get_customer_orders(
             detail="Access denied"
         )
     
-    orders = db.query(Order).filter(
-        Order.customer_id == customer_id
-    ).order_by(Order.created_at.desc()).all()
-    return orders
+    return await _paginate_orders(
+        request, response, db, select(Order).where(Order.customer_id == customer_id),
+        limit, cursor, order_status, created_from, created_to
+    )
+
+@router.get("/export")
+async def export_orders(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    compress: bool = Query(False, alias="gzip"),
+    order_status: Optional[str] = Query(None, alias="status"),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    admin: Admin = Depends(get_current_admin)
+):
+    """Stream matching orders oldest first as NDJSON (one order per line) or CSV (one row per item)"""
+    query = _filter_orders(
+        select(Order), order_status, created_from, created_to
+    ).order_by(Order.created_at, Order.id)
+    
+    filename = f"orders.{export_format}"
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        stream_orders(query, export_format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/events")
+async def stream_order_events(
+    last_event_id: Optional[int] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    admin: Admin = Depends(get_current_admin)
+):
+    """Server-sent order_created / order_status_changed events, resumable with Last-Event-ID"""
+    if last_event_id is None and last_event_id_header:
+        try:
+            last_event_id = int(last_event_id_header)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid Last-Event-ID"
+            )
+    
+    return StreamingResponse(
+        order_event_stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/{order_id}", response_model=OrderResponse)
-def get_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def get_order(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(
+        select(Order).where(Order.id == order_id).options(selectinload(Order.items))
+    )
     if not order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -88,22 +332,33 @@ def get_order(order_id: int, db: Session = Depends(get_db)):
         )
     return order
 
-@router.put("/{order_id}/status", response_model=OrderResponse)
-def update_order_status(
-    order_id: int,
-    order_update: OrderUpdate,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
-    db_order = db.query(Order).filter(Order.id == order_id).first()
+async def _set_order_status(db: AsyncSession, order_id: int, new_status: str) -> Order:
+    db_order = await db.scalar(
+        select(Order).where(Order.id == order_id).options(selectinload(Order.items))
+    )
     if not db_order:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
-    db_order.status = order_update.status
+    old_status = db_order.status
+    db_order.status = new_status
     db_order.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_order)
+    await db.flush()
+    await record_status_change(db, db_order, old_status)
+    if old_status != new_status:
+        await record_order_event(db, ORDER_STATUS_CHANGED, db_order, old_status=old_status)
+    return db_order
+
+@router.put("/{order_id}/status", response_model=OrderResponse)
+async def update_order_status(
+    order_id: int,
+    order_update: OrderUpdate,
+    admin: Admin = Depends(get_current_admin)
+):
+    db_order = await write_queue.submit(
+        lambda db: _set_order_status(db, order_id, order_update.status)
+    )
+    order_event_broker.notify()
     return db_order
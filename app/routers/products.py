@@ -1,36 +1,96 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 import os
-import uuid
 from ..database import get_db
 from ..models import Product, Admin
-from ..schemas import ProductCreate, ProductUpdate, ProductResponse
+from ..schemas import ProductCreate, ProductUpdate, ProductResponse, ProductChanges
 from ..auth import get_current_admin
+from ..catalog_cache import cached_catalog_response, bump_catalog_version
+from ..imports import import_products
+from ..uploads import save_upload
+from ..images import image_processor
+from ..writer import write_queue
+from ..search import match_expression, search_query
+from ..changes import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, decode_watermark, load_changes, record_tombstone, watermark_expired
+)
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 @router.get("", response_model=List[ProductResponse])
-def get_products(
+async def get_products(
+    request: Request,
     category_id: Optional[int] = Query(None),
     available_only: bool = Query(False),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    query = db.query(Product)
+    async def load():
+        query = select(Product)
+        
+        if category_id:
+            query = query.where(Product.category_id == category_id)
+        
+        if available_only:
+            query = query.where(Product.is_available == True)
+        
+        return (await db.scalars(query)).all()
     
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
+    return await cached_catalog_response(
+        request, db, ("products", category_id, available_only), ProductResponse, load
+    )
+
+@router.get("/search", response_model=List[ProductResponse])
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    category_id: Optional[int] = Query(None),
+    available_only: bool = Query(False),
+    db: AsyncSession = Depends(get_db)
+):
+    """Typeahead search over product and category names, best matches first"""
+    match = match_expression(q)
+    
+    async def load():
+        if match is None:
+            return []
+        query = search_query(match, limit, category_id, available_only)
+        return (await db.scalars(query)).all()
     
-    if available_only:
-        query = query.filter(Product.is_available == True)
+    return await cached_catalog_response(
+        request, db, ("search", match, limit, category_id, available_only), ProductResponse, load
+    )
+
+@router.get("/changes", response_model=ProductChanges)
+async def get_product_changes(
+    since: Optional[str] = Query(None),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    """Products changed and catalog rows deleted after `since`; omit it for a full sync"""
+    since_key = None
+    if since:
+        try:
+            since_key = decode_watermark(since)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid watermark"
+            )
+        if await watermark_expired(db, since_key):
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail="Watermark expired, sync again without since"
+            )
     
-    products = query.all()
-    return products
+    return await load_changes(db, since_key, limit)
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
+    product = await db.get(Product, product_id)
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -38,26 +98,15 @@ def get_product(product_id: int, db: Session = Depends(get_db)):
         )
     return product
 
-@router.post("", response_model=ProductResponse)
-def create_product(
-    product: ProductCreate,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
+async def _create_product(db: AsyncSession, product: ProductCreate) -> Product:
     db_product = Product(**product.dict())
     db.add(db_product)
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
+    await bump_catalog_version(db)
     return db_product
 
-@router.put("/{product_id}", response_model=ProductResponse)
-def update_product(
-    product_id: int,
-    product: ProductUpdate,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+async def _update_product(db: AsyncSession, product_id: int, product: ProductUpdate) -> Product:
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -69,73 +118,113 @@ def update_product(
         setattr(db_product, key, value)
     
     db_product.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_product)
+    await db.flush()
+    await bump_catalog_version(db)
     return db_product
 
-@router.delete("/{product_id}")
-def delete_product(
-    product_id: int,
-    db: Session = Depends(get_db),
-    admin: Admin = Depends(get_current_admin)
-):
-    db_product = db.query(Product).filter(Product.id == product_id).first()
+async def _delete_product(db: AsyncSession, product_id: int):
+    db_product = await db.get(Product, product_id)
     if not db_product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
     
-    db.delete(db_product)
-    db.commit()
+    await db.delete(db_product)
+    await record_tombstone(db, "product", product_id)
+    await bump_catalog_version(db)
+
+@router.post("", response_model=ProductResponse)
+async def create_product(
+    product: ProductCreate,
+    admin: Admin = Depends(get_current_admin)
+):
+    return await write_queue.submit(lambda db: _create_product(db, product))
+
+@router.put("/{product_id}", response_model=ProductResponse)
+async def update_product(
+    product_id: int,
+    product: ProductUpdate,
+    admin: Admin = Depends(get_current_admin)
+):
+    return await write_queue.submit(lambda db: _update_product(db, product_id, product))
+
+@router.delete("/{product_id}")
+async def delete_product(
+    product_id: int,
+    admin: Admin = Depends(get_current_admin)
+):
+    await write_queue.submit(lambda db: _delete_product(db, product_id))
     return {"message": "Product deleted successfully"}
 
-@router.post("/upload-image")
-async def upload_product_image(
-    file: UploadFile = File(...),
+@router.post("/import")
+async def bulk_import_products(
+    request: Request,
+    import_format: Optional[str] = Query(None, alias="format", pattern="^(ndjson|csv)$"),
+    db: AsyncSession = Depends(get_db),
     admin: Admin = Depends(get_current_admin)
 ):
-    """Upload product image"""
-    # Log for debugging
-    print(f"Received file: {file.filename}")
-    print(f"Content type: {file.content_type}")
+    """Upsert products by name from a streamed CSV or NDJSON body"""
+    if import_format is None:
+        content_type = request.headers.get("content-type", "")
+        if "csv" in content_type:
+            import_format = "csv"
+        elif "json" in content_type:
+            import_format = "ndjson"
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Send text/csv or application/x-ndjson, or pass ?format="
+            )
     
+    return await import_products(request.stream(), import_format, db)
+
+@router.post(
+    "/upload-image",
+    openapi_extra={"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "properties": {"file": {"type": "string", "format": "binary"}},
+        "required": ["file"]
+    }}}}}
+)
+async def upload_product_image(
+    request: Request,
+    admin: Admin = Depends(get_current_admin)
+):
+    """Upload product image as the multipart field `file`"""
     # Validate file type by extension (more reliable across platforms)
     allowed_extensions = [".jpg", ".jpeg", ".png", ".webp"]
     
-    # Get file extension
-    file_extension = os.path.splitext(file.filename)[1].lower() if file.filename else ""
-    
-    print(f"File extension: {file_extension}")
+    def extension_for(filename: str) -> str:
+        # Checked as soon as the part headers arrive, before any bytes are stored
+        file_extension = os.path.splitext(filename)[1].lower()
+        
+        if file_extension not in allowed_extensions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Only JPEG, PNG, and WebP images are allowed. Received: {filename}"
+            )
+        
+        if file_extension == ".jpeg":
+            file_extension = ".jpg"
+        return file_extension
     
-    if file_extension not in allowed_extensions:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Only JPEG, PNG, and WebP images are allowed. Received: {file.filename}"
-        )
-    
-    # Create uploads directory if it doesn't exist
-    upload_dir = "uploads/products"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    # Generate unique filename
-    file_extension = file.filename.split(".")[-1]
-    unique_filename = f"{uuid.uuid4()}.{file_extension}"
-    file_path = os.path.join(upload_dir, unique_filename)
-    
-    # Save file
+    # Stream to disk under the content hash; identical uploads share one file
     try:
-        contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
-    except Exception as e:
+        image_path = await save_upload(request, "file", "products", extension_for)
+    except HTTPException:
+        raise
+    except OSError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload image: {str(e)}"
         )
     
+    # Thumbnails and WebP/AVIF variants are generated in the background
+    image_processor.submit(image_path)
+    
     # Return the image path (will be served as static file)
     return {
-        "image_path": f"/uploads/products/{unique_filename}",
+        "image_path": image_path,
         "message": "Image uploaded successfully"
     }
@@ -1,22 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from ..database import get_db
-from ..models import Settings, Admin
+from pydantic import BaseModel
+from typing import Union
+from ..models import Admin
 from ..auth import get_current_admin
+from ..settings_registry import settings_registry, DISCOUNT_PERCENTAGE
+from ..writer import write_queue
 
 router = APIRouter(prefix="/settings", tags=["Settings"])
 
+# Request models
+class SettingUpdate(BaseModel):
+    value: Union[bool, int, float, str]
+
 @router.get("/discount")
-def get_discount(db: Session = Depends(get_db)):
-    setting = db.query(Settings).filter(Settings.key == "discount_percentage").first()
-    if not setting:
-        return {"discount_percentage": 0.0}
-    return {"discount_percentage": float(setting.value)}
+async def get_discount():
+    # Served from memory; see settings_registry.py
+    return {"discount_percentage": await settings_registry.get(DISCOUNT_PERCENTAGE)}
 
 @router.put("/discount")
-def update_discount(
+async def update_discount(
     discount: float,
-    db: Session = Depends(get_db),
     admin: Admin = Depends(get_current_admin)
 ):
     if discount < 0 or discount > 100:
@@ -25,12 +28,27 @@ def update_discount(
             detail="Discount must be between 0 and 100"
         )
     
-    setting = db.query(Settings).filter(Settings.key == "discount_percentage").first()
-    if setting:
-        setting.value = str(discount)
-    else:
-        setting = Settings(key="discount_percentage", value=str(discount))
-        db.add(setting)
-    
-    db.commit()
+    await write_queue.submit(lambda db: settings_registry.set(db, DISCOUNT_PERCENTAGE, discount))
+    settings_registry.invalidate()
     return {"discount_percentage": discount}
+
+@router.get("")
+async def get_settings(admin: Admin = Depends(get_current_admin)):
+    return await settings_registry.all()
+
+@router.put("/{key}")
+async def update_setting(
+    key: str,
+    setting: SettingUpdate,
+    admin: Admin = Depends(get_current_admin)
+):
+    try:
+        value = await write_queue.submit(lambda db: settings_registry.set(db, key, setting.value))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid value for {key}: {e}"
+        )
+    
+    settings_registry.invalidate()
+    return {key: value}
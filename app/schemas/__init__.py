@@ -1,13 +1,15 @@
 from .admin import AdminCreate, AdminLogin, AdminResponse, TokenResponse
 from .category import CategoryCreate, CategoryUpdate, CategoryResponse
-from .product import ProductCreate, ProductUpdate, ProductResponse
+from .product import ProductCreate, ProductUpdate, ProductResponse, ProductChanges
 from .customer import CustomerLogin, CustomerResponse
+from .cart import CartLine, CartQuoteRequest, QuoteLine, CartQuote
 from .order import OrderCreate, OrderUpdate, OrderResponse, OrderItemCreate, OrderItemResponse
 
 __all__ = [
     "AdminCreate", "AdminLogin", "AdminResponse", "TokenResponse",
     "CategoryCreate", "CategoryUpdate", "CategoryResponse",
-    "ProductCreate", "ProductUpdate", "ProductResponse",
+    "ProductCreate", "ProductUpdate", "ProductResponse", "ProductChanges",
     "CustomerLogin", "CustomerResponse",
-    "OrderCreate", "OrderUpdate", "OrderResponse", "OrderItemCreate", "OrderItemResponse"
+    "OrderCreate", "OrderUpdate", "OrderResponse", "OrderItemCreate", "OrderItemResponse",
+    "CartLine", "CartQuoteRequest", "QuoteLine", "CartQuote"
 ]
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import datetime
+
+class CartLine(BaseModel):
+    product_id: int
+    quantity: int
+
+class CartQuoteRequest(BaseModel):
+    items: List[CartLine] = Field(..., min_length=1, max_length=200)
+
+class QuoteLine(BaseModel):
+    product_id: int
+    product_name: Optional[str] = None
+    quantity: int
+    unit_price: Optional[float] = None
+    line_total: Optional[float] = None
+    # ok, insufficient_stock, unavailable, not_found or invalid_quantity
+    stock_status: str
+    available_stock: Optional[int] = None
+
+class CartQuote(BaseModel):
+    items: List[QuoteLine]
+    subtotal: float
+    discount_percentage: float
+    discount_amount: float
+    total: float
+    orderable: bool
+    # Pass to POST /orders as quote_token; only issued when every line is orderable
+    quote_token: Optional[str] = None
+    expires_at: Optional[datetime] = None
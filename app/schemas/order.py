@@ -23,6 +23,8 @@ class OrderCreate(BaseModel):
     payment_mode: str  # COD or ONLINE
     note: Optional[str] = None
     items: List[OrderItemCreate]
+    # From POST /cart/quote; when given, prices and total come from the quote
+    quote_token: Optional[str] = None
 
 class OrderUpdate(BaseModel):
     status: str
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, computed_field
+from typing import Dict, List, Optional
 from datetime import datetime
+from ..images import variant_urls
 
 class ProductBase(BaseModel):
     name: str
@@ -26,5 +27,18 @@ class ProductResponse(ProductBase):
     created_at: datetime
     updated_at: datetime
 
+    @computed_field
+    @property
+    def image_variants(self) -> Optional[Dict[str, str]]:
+        """Resized image URL per size, e.g. image_variants["thumb"]"""
+        return variant_urls(self.image_path)
+
     class Config:
         from_attributes = True
+
+class ProductChanges(BaseModel):
+    products: List[ProductResponse]
+    deleted_product_ids: List[int]
+    deleted_category_ids: List[int]
+    watermark: str
+    has_more: bool
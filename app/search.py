@@ -0,0 +1,155 @@
+"""Full-text product search on an SQLite FTS5 index.
+
+products_fts holds one row per product (rowid = products.id) with the
+product name and its category's name. Triggers on products and categories
+keep it in sync with every write path, including the bulk import's Core
+statements, so application code never has to update it. The index is
+created and filled on startup if missing; to rebuild it by hand:
+
+    python -m app.search rebuild
+"""
+import re
+from typing import Optional
+from sqlalchemy import column, func, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+from .models import Product
+
+FTS_TABLE = "products_fts"
+
+# bm25 weight per column: a hit in the product name counts far more than
+# one in the category name
+NAME_WEIGHT = 10.0
+CATEGORY_WEIGHT = 2.0
+
+FTS_DDL = [
+    # prefix='2 3' keeps extra indexes for 2- and 3-character prefixes,
+    # the common typeahead case, so "ri*" doesn't scan the whole term list
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, category, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, category)
+        VALUES (new.id, new.name, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, category_id ON products BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, name, category)
+        VALUES (new.id, new.name, (SELECT name FROM categories WHERE id = new.category_id));
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS categories_fts_rename AFTER UPDATE OF name ON categories BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT id FROM products WHERE category_id = new.id);
+    END
+    """,
+]
+
+REBUILD_SQL = [
+    f"DELETE FROM {FTS_TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE}(rowid, name, category)
+    SELECT products.id, products.name, categories.name
+    FROM products LEFT JOIN categories ON categories.id = products.category_id
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')",
+]
+
+products_fts = table(FTS_TABLE, column("rowid"), column("name"), column("category"))
+
+def ensure_search_index(engine: Engine):
+    """Create the FTS table and triggers if missing, filling the table when it is new"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        for statement in FTS_DDL:
+            conn.exec_driver_sql(statement)
+        if not exists:
+            for statement in REBUILD_SQL:
+                conn.exec_driver_sql(statement)
+
+def drop_search_index(engine: Engine):
+    """Remove the FTS table and triggers, e.g. before a bulk load; ensure_search_index restores them"""
+    with engine.begin() as conn:
+        for trigger in ("products_fts_insert", "products_fts_update", "products_fts_delete", "categories_fts_rename"):
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+def rebuild_search_index(engine: Engine) -> int:
+    with engine.begin() as conn:
+        for statement in REBUILD_SQL:
+            conn.exec_driver_sql(statement)
+        return conn.exec_driver_sql(f"SELECT count(*) FROM {FTS_TABLE}").scalar()
+
+def match_expression(query: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, as a prefix.
+
+    Words are quoted, so FTS syntax in user input (AND, NEAR, *, ...) is
+    searched for literally rather than interpreted.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+def search_query(
+    match: str,
+    limit: int,
+    category_id: Optional[int] = None,
+    available_only: bool = False
+):
+    """Products matching `match` (see match_expression), best first"""
+    rank = func.bm25(literal_column(FTS_TABLE), NAME_WEIGHT, CATEGORY_WEIGHT)
+    matches = literal_column(FTS_TABLE).op("MATCH")(match)
+    
+    if not category_id and not available_only:
+        # Rank and cut inside the FTS table, then load only the winners; a
+        # short prefix can match thousands of rows and joining them all to
+        # products before sorting costs more than the ranking itself
+        hits = (
+            select(products_fts.c.rowid.label("product_id"), rank.label("score"))
+            .where(matches)
+            .order_by(rank)
+            .limit(limit)
+            .subquery()
+        )
+        return (
+            select(Product)
+            .join(hits, hits.c.product_id == Product.id)
+            .order_by(hits.c.score, Product.id)
+        )
+    
+    query = (
+        select(Product)
+        .join(products_fts, products_fts.c.rowid == Product.id)
+        .where(matches)
+    )
+    if category_id:
+        query = query.where(Product.category_id == category_id)
+    if available_only:
+        query = query.where(Product.is_available == True)
+    return query.order_by(rank, Product.id).limit(limit)
+
+if __name__ == "__main__":
+    import sys
+    from .database import engine, Base
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python -m app.search rebuild")
+        sys.exit(1)
+
+    Base.metadata.create_all(bind=engine)
+    ensure_search_index(engine)
+    print(f"✓ Indexed {rebuild_search_index(engine)} products")
@@ -4,11 +4,21 @@ import os
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import argparse
+import asyncio
+import bisect
+import itertools
+import math
+import random
+import time
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine, Base
-from app.models import Admin, Category, Product, Settings
+from app.database import AsyncSessionLocal, SessionLocal, engine, Base
+from app.models import Admin, Category, Customer, Order, OrderItem, Product, Settings
 from app.auth import get_password_hash
-from datetime import datetime
+from app.analytics import rebuild_order_stats
+from app.search import drop_search_index, ensure_search_index
+from datetime import datetime, timedelta
 
 def seed_database():
     """Seed the database with initial data"""
@@ -119,5 +129,236 @@ def seed_database():
     finally:
         db.close()
 
+# Scale mode: synthetic, production-sized data for load testing
+
+SCALE_BATCH_SIZE = 20000
+
+PRODUCT_WORDS = [
+    "Basmati", "Brown", "Organic", "Premium", "Classic", "Fresh", "Masala", "Roasted",
+    "Salted", "Spicy", "Sweet", "Instant", "Natural", "Family", "Mini", "Super",
+]
+PRODUCT_NOUNS = [
+    "Rice", "Atta", "Sugar", "Oil", "Dal", "Chana", "Tea", "Coffee", "Biscuits", "Chips",
+    "Noodles", "Salt", "Turmeric", "Ghee", "Butter", "Paneer", "Soap", "Shampoo",
+    "Detergent", "Toothpaste", "Honey", "Jam", "Ketchup", "Pickle", "Cashews", "Oats",
+]
+PACK_SIZES = ["100g", "250g", "500g", "1kg", "2kg", "5kg", "200ml", "500ml", "1L"]
+FIRST_NAMES = [
+    "Aarav", "Vivaan", "Aditya", "Arjun", "Sai", "Reyansh", "Ananya", "Diya", "Isha",
+    "Kavya", "Meera", "Priya", "Rahul", "Rohan", "Sneha", "Pooja", "Vikram", "Neha",
+]
+LAST_NAMES = ["Sharma", "Verma", "Patel", "Reddy", "Nair", "Iyer", "Gupta", "Singh", "Das", "Rao"]
+STREETS = ["MG Road", "Station Road", "Market Street", "Temple Road", "Lake View", "Gandhi Nagar"]
+
+# Statuses by order age: recent orders are still in flight, older ones settled
+# (statuses, cumulative weights)
+RECENT_STATUSES = (["PENDING", "CONFIRMED", "OUT_FOR_DELIVERY", "DELIVERED", "CANCELLED"], [30, 55, 70, 95, 100])
+SETTLED_STATUSES = (["DELIVERED", "CANCELLED"], [93, 100])
+
+def _zipf_cum_weights(count, exponent=1.0):
+    """Cumulative weights where item i is picked with probability ~ 1 / (i + 1) ** exponent"""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(count)))
+
+def _timestamp(value: datetime) -> str:
+    # The format SQLAlchemy's SQLite DateTime stores and compares against
+    return value.isoformat(sep=" ", timespec="microseconds")
+
+def _bulk_insert(conn, table, columns, rows):
+    """executemany `rows` (tuples in `columns` order) in SCALE_BATCH_SIZE batches; returns the count"""
+    statement = f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, SCALE_BATCH_SIZE))
+        if not batch:
+            return count
+        conn.exec_driver_sql(statement, batch)
+        count += len(batch)
+
+def _report(label, count, started):
+    elapsed = time.perf_counter() - started
+    print(f"✓ {label}: {count:,} rows in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/sec)")
+
+def seed_scale(products: int, customers: int, orders: int, days: int, seed: int = 42):
+    """Append synthetic products, customers and orders with skewed, realistic distributions.
+
+    The same arguments and seed produce the same rows (timestamps run up to
+    midnight UTC). Product popularity follows a Zipf-like curve and customer
+    order frequency a log-normal one, order volume grows over the period with
+    an evening peak each day, and item counts, quantities and statuses are
+    skewed the way real orders are.
+    """
+    rng = random.Random(seed)
+    # Anchored to midnight so a given seed produces identical rows all day
+    now = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = now - timedelta(days=days)
+    total_started = time.perf_counter()
+    total_rows = 0
+    
+    # Triggers would update the search index row by row; rebuild it once at the end
+    drop_search_index(engine)
+    
+    # Secondary indexes on the big tables are rebuilt once after the load,
+    # which is far cheaper than updating them row by row in random order
+    deferred_indexes = list(Order.__table__.indexes) + list(OrderItem.__table__.indexes)
+    for index in deferred_indexes:
+        index.drop(bind=engine, checkfirst=True)
+    
+    # One transaction for the whole load: a single commit instead of one per batch
+    with engine.begin() as conn:
+        category_ids = list(conn.execute(select(Category.id)).scalars())
+        next_product_id = (conn.execute(select(func.max(Product.id))).scalar() or 0) + 1
+        next_customer_id = (conn.execute(select(func.max(Customer.id))).scalar() or 0) + 1
+        next_order_id = (conn.execute(select(func.max(Order.id))).scalar() or 0) + 1
+        
+        # Products: a few categories hold most of the catalog, prices are log-normal
+        started = time.perf_counter()
+        category_weights = _zipf_cum_weights(len(category_ids), 0.8)
+        catalog = []
+        
+        def product_rows():
+            created = _timestamp(start)
+            for offset in range(products):
+                product_id = next_product_id + offset
+                name = (
+                    f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_NOUNS)} "
+                    f"({rng.choice(PACK_SIZES)}) #{product_id}"
+                )
+                price = round(min(max(rng.lognormvariate(4.3, 0.8), 5.0), 5000.0), 2)
+                stock = 0 if rng.random() < 0.05 else int(rng.paretovariate(1.2) * 10)
+                catalog.append((product_id, name, price))
+                yield (
+                    product_id, rng.choices(category_ids, cum_weights=category_weights)[0],
+                    name, price, stock, rng.random() > 0.03, None, created, created
+                )
+        
+        count = _bulk_insert(conn, Product.__table__, [
+            "id", "category_id", "name", "price", "stock", "is_available", "image_path",
+            "created_at", "updated_at",
+        ], product_rows())
+        total_rows += count
+        _report("products", count, started)
+        
+        # Customers: sign-ups spread over the period
+        started = time.perf_counter()
+        people = []
+        
+        def customer_rows():
+            for offset in range(customers):
+                customer_id = next_customer_id + offset
+                name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                phone = f"{6000000000 + customer_id}"
+                address = f"{rng.randint(1, 400)}, {rng.choice(STREETS)}, Block {rng.randint(1, 60)}"
+                people.append((customer_id, name, phone, address))
+                joined = start + timedelta(seconds=rng.random() * days * 86400)
+                yield customer_id, phone, name, _timestamp(joined)
+        
+        count = _bulk_insert(conn, Customer.__table__, ["id", "phone", "name", "created_at"], customer_rows())
+        total_rows += count
+        _report("customers", count, started)
+        
+        if not catalog:
+            catalog = [
+                tuple(row) for row in conn.execute(select(Product.id, Product.name, Product.price))
+            ]
+        if orders and (not catalog or not people):
+            print("⚠ Orders need at least one product and one customer; skipping orders")
+            orders = 0
+        
+        # Orders, oldest first so ids grow with created_at like real traffic
+        started = time.perf_counter()
+        rng.shuffle(catalog)
+        rng.shuffle(people)
+        product_weights = _zipf_cum_weights(len(catalog), 0.8)
+        # Most customers order now and then, a few order every other day
+        customer_weights = list(itertools.accumulate(rng.lognormvariate(0, 1.0) for _ in people))
+        items = []
+        
+        def order_time(index):
+            # Volume grows ~3x over the period (inverse CDF of a linear ramp),
+            # with an evening peak around 19:00 within each day
+            position = (index + rng.random()) / orders
+            day_fraction = (math.sqrt(1 + 8 * position) - 1) / 2
+            day_start = start + timedelta(days=int(day_fraction * days))
+            hour = rng.gauss(19, 3.5)
+            while not 6 <= hour < 24:
+                hour = rng.gauss(19, 3.5)
+            return day_start + timedelta(hours=hour)
+        
+        def order_rows():
+            times = sorted(order_time(index) for index in range(orders))
+            recent_since = now - timedelta(days=2)
+            for batch_start in range(0, orders, SCALE_BATCH_SIZE):
+                batch_times = times[batch_start:batch_start + SCALE_BATCH_SIZE]
+                # Draw customers and products for the whole batch at once;
+                # per-order random.choices calls dominate the run time otherwise
+                buyers = rng.choices(people, cum_weights=customer_weights, k=len(batch_times))
+                line_counts = [min(1 + int(rng.expovariate(0.45)), 12) for _ in batch_times]
+                picks = iter(rng.choices(catalog, cum_weights=product_weights, k=sum(line_counts)))
+                for offset, created in enumerate(batch_times):
+                    order_id = next_order_id + batch_start + offset
+                    customer_id, name, phone, address = buyers[offset]
+                    total = 0.0
+                    for product_id, product_name, price in itertools.islice(picks, line_counts[offset]):
+                        quantity = 1 if rng.random() < 0.7 else rng.randint(2, 5)
+                        total += quantity * price
+                        items.append((order_id, product_id, product_name, quantity, price))
+                    statuses, cum_weights = RECENT_STATUSES if created >= recent_since else SETTLED_STATUSES
+                    status = statuses[bisect.bisect(cum_weights, rng.random() * cum_weights[-1])]
+                    updated = created + timedelta(hours=rng.uniform(0.5, 36))
+                    yield (
+                        order_id, customer_id, name, phone, address, round(total, 2),
+                        "COD" if rng.random() < 0.65 else "ONLINE", status,
+                        None, _timestamp(created), _timestamp(min(updated, now))
+                    )
+        
+        order_columns = [
+            "id", "customer_id", "customer_name", "customer_phone", "delivery_address",
+            "total_amount", "payment_mode", "status", "note", "created_at", "updated_at",
+        ]
+        item_columns = ["order_id", "product_id", "product_name", "quantity", "price_at_order"]
+        order_count = item_count = 0
+        generator = order_rows()
+        while True:
+            # Alternate between order and item batches so items never pile up in memory
+            batch = _bulk_insert(conn, Order.__table__, order_columns, itertools.islice(generator, SCALE_BATCH_SIZE))
+            if not batch:
+                break
+            order_count += batch
+            item_count += _bulk_insert(conn, OrderItem.__table__, item_columns, iter(items))
+            items.clear()
+        total_rows += order_count + item_count
+        _report("orders", order_count, started)
+        print(f"  with {item_count:,} order items")
+    
+    started = time.perf_counter()
+    for index in deferred_indexes:
+        index.create(bind=engine, checkfirst=True)
+    _report("order indexes", order_count + item_count, started)
+    
+    started = time.perf_counter()
+    ensure_search_index(engine)
+    _report("search index", products, started)
+    
+    async def rebuild_rollups():
+        async with AsyncSessionLocal() as db:
+            return await rebuild_order_stats(db)
+    
+    started = time.perf_counter()
+    count = asyncio.run(rebuild_rollups())
+    _report("analytics rollups", count, started)
+    
+    elapsed = time.perf_counter() - total_started
+    print(f"\n✅ Generated {total_rows:,} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/sec)")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seed the database; add sizes for synthetic load-test data")
+    parser.add_argument("--products", type=int, default=0)
+    parser.add_argument("--customers", type=int, default=0)
+    parser.add_argument("--orders", type=int, default=0)
+    parser.add_argument("--days", type=int, default=90, help="period the generated orders span")
+    parser.add_argument("--seed", type=int, default=42, help="random seed; same seed, same data")
+    args = parser.parse_args()
+    
     seed_database()
+    if args.products or args.customers or args.orders:
+        seed_scale(args.products, args.customers, args.orders, args.days, args.seed)
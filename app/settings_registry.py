@@ -0,0 +1,130 @@
+"""In-memory, typed view of the settings table.
+
+Every row of `settings` is loaded once and parsed with the type registered
+for its key (keys nobody registered stay strings), so reads cost a dict
+lookup instead of a SELECT and a float(). Writes go through `set`, which
+upserts the row and bumps the shared `settings_version` counter in the same
+transaction. The worker that wrote reloads on its next read; every other
+worker checks the counter at most once per CHECK_INTERVAL seconds and
+reloads when it moved, so all workers agree within that delay.
+"""
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from .counters import bump_counter, get_counter
+from .database import AsyncSessionLocal
+from .models import Settings
+
+SETTINGS_VERSION = "settings_version"
+CHECK_INTERVAL = 2.0  # seconds
+
+DISCOUNT_PERCENTAGE = "discount_percentage"
+
+def _parse_bool(raw: str) -> bool:
+    value = raw.strip().lower()
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"not a boolean: {raw!r}")
+
+def _parse_percentage(raw: str) -> float:
+    value = float(raw)
+    if not 0 <= value <= 100:
+        raise ValueError("must be between 0 and 100")
+    return value
+
+PARSERS = {bool: _parse_bool}
+
+class SettingsRegistry:
+    def __init__(self, check_interval: float = CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._types: Dict[str, tuple] = {}
+        self._values: Dict[str, Any] = {}
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = None
+        self._loop = None
+
+    def register(self, key: str, parse: Callable[[str], Any], default: Any = None):
+        """Parse `key` with `parse` (a type such as float, or a function raising ValueError)"""
+        self._types[key] = (PARSERS.get(parse, parse), default)
+
+    def parse(self, key: str, raw: str) -> Any:
+        """Typed value of `raw` for `key`; raises ValueError if it doesn't parse"""
+        if key not in self._types:
+            return raw
+        return self._types[key][0](raw)
+
+    def _load_value(self, key: str, raw: str) -> Any:
+        try:
+            return self.parse(key, raw)
+        except ValueError:
+            # A bad row written by hand shouldn't take the setting down
+            return self._types[key][1]
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._loop is not loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _fresh(self) -> bool:
+        return self._version is not None and time.monotonic() - self._checked_at < self.check_interval
+
+    async def _refresh(self):
+        if self._fresh():
+            return
+        async with self._get_lock():
+            if self._fresh():
+                return
+            async with AsyncSessionLocal() as db:
+                version = await get_counter(db, SETTINGS_VERSION)
+                if version != self._version:
+                    rows = await db.execute(select(Settings.key, Settings.value))
+                    self._values = {key: self._load_value(key, raw) for key, raw in rows}
+                    self._version = version
+            self._checked_at = time.monotonic()
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        await self._refresh()
+        if key in self._values:
+            return self._values[key]
+        if default is None and key in self._types:
+            return self._types[key][1]
+        return default
+
+    async def all(self) -> Dict[str, Any]:
+        await self._refresh()
+        values = {key: default for key, (_, default) in self._types.items()}
+        values.update(self._values)
+        return values
+
+    async def set(self, db: AsyncSession, key: str, value: Any) -> Any:
+        """Store `value` under `key`; call before committing, then invalidate().
+
+        Returns the typed value; raises ValueError if it doesn't parse.
+        """
+        raw = str(value)
+        parsed = self.parse(key, raw)
+        now = datetime.utcnow()
+        stmt = insert(Settings).values(key=key, value=raw, updated_at=now)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Settings.key],
+            set_={"value": raw, "updated_at": now}
+        )
+        await db.execute(stmt)
+        await bump_counter(db, SETTINGS_VERSION)
+        return parsed
+
+    def invalidate(self):
+        """Check the version on the next read, e.g. after committing a set()"""
+        self._checked_at = 0.0
+
+settings_registry = SettingsRegistry()
+settings_registry.register(DISCOUNT_PERCENTAGE, _parse_percentage, 0.0)
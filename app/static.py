@@ -0,0 +1,214 @@
+"""Static file serving for /uploads.
+
+Uploaded files are never rewritten (new content gets a new name), so every
+response is marked immutable for a year and clients only revalidate when
+they lose their cache. On top of Starlette's StaticFiles this adds:
+
+- ETags taken from the content-hashed file name, stable across servers
+- single byte ranges (Range / If-Range, 206 and 416 responses)
+- ?size=thumb|medium, answered with the pre-resized AVIF/WebP variant the
+  client accepts, else the resize in the original's format (so clients that
+  send no image Accept header still get a small file), falling back to the
+  original (cached briefly, not immutable) until variants exist
+- precompressed <file>.br / <file>.gz siblings for clients that accept them
+- zero-copy sends through the ASGI pathsend / zerocopysend extensions when
+  the server offers them, chunked reads otherwise
+"""
+import mimetypes
+import os
+import re
+import stat
+from typing import Optional, Tuple
+import anyio
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+from .images import VARIANT_DIRNAME, VARIANT_FORMATS, VARIANT_SIZES, source_format
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+# ?size= answered with the original while its variant is still missing: the
+# same URL will serve different bytes soon, so keep caches short-lived
+FALLBACK_CACHE_CONTROL = "public, max-age=60"
+CONTENT_HASH = re.compile(r"^[0-9a-f]{64}(-\w+)?$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+# Best first; only used when the client lists the encoding in Accept-Encoding
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+# Best first; only used when the client lists the type in Accept
+VARIANT_PREFERENCE = [("avif", "image/avif"), ("webp", "image/webp")]
+
+def _stat_file(path: str) -> Optional[os.stat_result]:
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result if stat.S_ISREG(stat_result.st_mode) else None
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single "bytes=" range; None if it can't be satisfied"""
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        raise ValueError(header)
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+class UploadFileResponse(FileResponse):
+    """FileResponse that can send part of the file, zero-copy when the server allows"""
+
+    def __init__(self, path: str, stat_result: os.stat_result, content_range: Optional[Tuple[int, int]] = None, **kwargs):
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.content_range = content_range
+        if content_range is not None:
+            start, end = content_range
+            self.status_code = 206
+            self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+            self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        start, end = self.content_range or (0, self.stat_result.st_size - 1)
+        count = end - start + 1
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        extensions = scope.get("extensions") or {}
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif self.content_range is None and "http.response.pathsend" in extensions:
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        elif "http.response.zerocopysend" in extensions:
+            with open(self.path, "rb") as file:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": start,
+                    "count": count,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as file:
+                await file.seek(start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+            if remaining > 0:
+                # File shrank underneath us; close the body rather than hang
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+class UploadFiles(StaticFiles):
+    def _select(self, full_path: str, stat_result: os.stat_result, scope: Scope, request_headers: Headers):
+        """Pick the file to send: a resized variant, a precompressed sibling, or the file itself.
+
+        Returns (path, stat_result, content encoding, Vary names, Cache-Control).
+        """
+        path, encoding, vary, cache_control = full_path, None, [], CACHE_CONTROL
+        size = QueryParams(scope.get("query_string", b"")).get("size")
+        if size in VARIANT_SIZES:
+            vary.append("Accept")
+            accept = request_headers.get("accept", "")
+            directory, filename = os.path.split(full_path)
+            stem = os.path.splitext(filename)[0]
+            for fmt, media_type in VARIANT_PREFERENCE:
+                if fmt not in VARIANT_FORMATS or media_type not in accept:
+                    continue
+                candidate = os.path.join(directory, VARIANT_DIRNAME, f"{stem}-{size}.{fmt}")
+                candidate_stat = _stat_file(candidate)
+                if candidate_stat is not None:
+                    return candidate, candidate_stat, None, vary, cache_control
+                # Not generated yet (or failed): this URL will change content
+                cache_control = FALLBACK_CACHE_CONTROL
+            own_format = source_format(filename)
+            if own_format is not None:
+                candidate = os.path.join(directory, VARIANT_DIRNAME, f"{stem}-{size}.{own_format}")
+                candidate_stat = _stat_file(candidate)
+                if candidate_stat is not None:
+                    return candidate, candidate_stat, None, vary, cache_control
+            # Nothing resized yet: the original, briefly cached
+            cache_control = FALLBACK_CACHE_CONTROL
+
+        accept_encoding = request_headers.get("accept-encoding", "")
+        for name, suffix in PRECOMPRESSED:
+            candidate_stat = _stat_file(path + suffix)
+            if candidate_stat is None:
+                continue
+            if "Accept-Encoding" not in vary:
+                vary.append("Accept-Encoding")
+            if name in accept_encoding:
+                return path + suffix, candidate_stat, name, vary, cache_control
+
+        return path, stat_result, encoding, vary, cache_control
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        # A few extra stats of sibling paths; cheap enough to do inline
+        path, stat_result, encoding, vary, cache_control = self._select(
+            str(full_path), stat_result, scope, request_headers
+        )
+
+        headers = {"cache-control": cache_control, "accept-ranges": "bytes"}
+        if vary:
+            headers["vary"] = ", ".join(vary)
+        if encoding:
+            headers["content-encoding"] = encoding
+        original_stem = os.path.splitext(os.path.basename(str(full_path)))[0]
+        if CONTENT_HASH.match(original_stem):
+            # The name already identifies the bytes, and each variant or
+            # precompressed sibling has a name of its own
+            headers["etag"] = f'"{os.path.basename(path)}"'
+
+        media_type = None
+        if encoding:
+            # Type of the uncompressed file, not of the .br/.gz wrapper
+            media_type = mimetypes.guess_type(str(full_path))[0]
+
+        response = UploadFileResponse(
+            path, stat_result=stat_result, status_code=status_code, headers=headers, media_type=media_type
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if range_header and status_code == 200 and self._if_range_matches(response.headers, request_headers):
+            try:
+                content_range = _parse_range(range_header, stat_result.st_size)
+            except ValueError:
+                # Malformed or multi-range: ignore it and send the whole file
+                return response
+            if content_range is None:
+                return Response(
+                    status_code=416,
+                    headers={"content-range": f"bytes */{stat_result.st_size}", **headers}
+                )
+            return UploadFileResponse(
+                path, stat_result=stat_result, content_range=content_range,
+                headers=headers, media_type=media_type
+            )
+        return response
+
+    @staticmethod
+    def _if_range_matches(response_headers, request_headers: Headers) -> bool:
+        if_range = request_headers.get("if-range")
+        if not if_range:
+            return True
+        return if_range in (response_headers.get("etag"), response_headers.get("last-modified"))
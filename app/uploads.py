@@ -0,0 +1,193 @@
+"""Content-addressed storage for uploaded files.
+
+The multipart request body is parsed as it arrives: the file field's bytes
+go straight into a temp file next to their final location, hashed as they
+are written, with every write done in a worker thread so a large image never
+blocks the event loop. Nothing is buffered or spooled in between, and the
+upload is cut off with 413 as soon as it crosses the size limit. The
+finished file is named after its SHA-256, so uploading the same bytes again
+returns the existing path.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Callable, List, Optional
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_ROOT = "uploads"
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("KPG_MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+# Room for boundaries, part headers and small form fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+# mkstemp creates files 0600; stored uploads are also read by whatever
+# serves /uploads in front of the app, which may run as another user
+UPLOAD_FILE_MODE = 0o644
+
+class _HashedFile:
+    """Temp file that hashes what is written to it; blocking, use from a worker thread"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        self.directory = directory
+        self.file = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+
+    def write(self, data: bytes):
+        self.digest.update(data)
+        self.file.write(data)
+
+    def store(self, extension: str) -> str:
+        """Move the file to <sha256><extension>; returns that name"""
+        self.file.close()
+        filename = f"{self.digest.hexdigest()}{extension}"
+        final_path = os.path.join(self.directory, filename)
+        # Same bytes already stored: keep the existing file
+        if not os.path.exists(final_path):
+            os.chmod(self.temp_path, UPLOAD_FILE_MODE)
+            os.replace(self.temp_path, final_path)
+        return filename
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+class _FileFieldParser:
+    """Feeds a multipart body to python-multipart, keeping only one file field"""
+
+    def __init__(self, boundary: bytes, field_name: str):
+        self.field_name = field_name.encode()
+        self.filename: Optional[str] = None
+        self.chunks: List[bytes] = []
+        self.finished = False
+        self._in_field = False
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def write(self, data: bytes):
+        self._parser.write(data)
+
+    def finalize(self):
+        self._parser.finalize()
+
+    def _on_part_begin(self):
+        self._in_field = False
+        self._disposition = b""
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_field:
+            self.chunks.append(data[start:end])
+
+    def _on_part_end(self):
+        if self._in_field:
+            self.finished = True
+            self._in_field = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") == self.field_name and b"filename" in options and self.filename is None:
+            self.filename = options[b"filename"].decode("utf-8", "replace")
+            self._in_field = True
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is larger than {max_bytes // (1024 * 1024)} MB"
+    )
+
+async def save_upload(
+    request: Request,
+    field_name: str,
+    subdirectory: str,
+    extension_for: Callable[[str], str],
+    max_bytes: int = MAX_UPLOAD_BYTES
+) -> str:
+    """Stream the `field_name` file of a multipart request to uploads/<subdirectory>/<sha256><extension>.
+
+    `extension_for(filename)` returns the extension to store under, or raises
+    HTTPException to refuse the file before any of it is written. Returns
+    the file's URL path.
+    """
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data body"
+        )
+    max_body = max_bytes + MULTIPART_OVERHEAD
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_body:
+        # Refuse before reading a byte of it
+        raise _too_large(max_bytes)
+
+    parser = _FileFieldParser(boundary, field_name)
+    directory = os.path.join(UPLOAD_ROOT, subdirectory)
+    target = None
+    extension = None
+    received = 0
+    written = 0
+    pending = []
+    pending_size = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_body:
+                raise _too_large(max_bytes)
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed multipart body: {e}")
+            if parser.filename is not None and target is None:
+                extension = extension_for(parser.filename)
+                target = await asyncio.to_thread(_HashedFile, directory)
+            if parser.chunks:
+                pending += parser.chunks
+                pending_size += sum(len(data) for data in parser.chunks)
+                parser.chunks.clear()
+                if written + pending_size > max_bytes:
+                    raise _too_large(max_bytes)
+            if pending_size >= UPLOAD_CHUNK_SIZE or (pending and parser.finished):
+                await asyncio.to_thread(target.write, b"".join(pending))
+                written += pending_size
+                pending, pending_size = [], 0
+        try:
+            parser.finalize()
+        except MultipartParseError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed multipart body: {e}")
+        if target is None or not parser.finished:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Missing file field '{field_name}'"
+            )
+        filename = await asyncio.to_thread(target.store, extension)
+    finally:
+        if target is not None:
+            await asyncio.to_thread(target.discard)
+    return f"/{UPLOAD_ROOT}/{subdirectory}/{filename}"
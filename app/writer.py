@@ -0,0 +1,114 @@
+"""In-process single-writer queue with group commit.
+
+SQLite allows one writer at a time, so instead of every request opening its
+own write transaction and racing for the lock, small write jobs are handed to
+one task that owns the writer connection. Whatever jobs are queued when it
+wakes up run back to back in a single transaction, each inside its own
+SAVEPOINT, and are committed together: one fsync for the whole batch.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+from sqlalchemy.ext.asyncio import AsyncSession
+from .database import WriterSessionLocal
+from .metrics import current_query_stats, reset_query_stats, use_query_stats
+
+T = TypeVar("T")
+
+MAX_BATCH_SIZE = 64
+
+class WriteQueue:
+    def __init__(self, max_batch: int = MAX_BATCH_SIZE):
+        self.max_batch = max_batch
+        self._queue = None
+        self._task = None
+        self._loop = None
+        # Enqueue time of every job still in the queue, oldest first
+        self._enqueued = deque()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._enqueued.clear()
+            self._task = loop.create_task(self._run())
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def wait_seconds(self) -> float:
+        """How long the oldest queued job has been waiting so far; drives load shedding"""
+        return time.monotonic() - self._enqueued[0] if self._enqueued else 0.0
+
+    async def submit(self, job: Callable[[AsyncSession], Awaitable[T]]) -> T:
+        """Run `job(session)` inside the next group commit and return its result.
+
+        The job must not commit or roll back itself; raising rolls back just
+        this job's SAVEPOINT and the exception is re-raised to the caller.
+        """
+        self._ensure_started()
+        future = self._loop.create_future()
+        self._enqueued.append(time.monotonic())
+        await self._queue.put((job, future, current_query_stats()))
+        return await future
+
+    async def _run(self):
+        # The task inherits the context of whichever request started it;
+        # BEGIN/COMMIT belong to no single request
+        use_query_stats(None)
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            for _ in batch:
+                self._enqueued.popleft()
+            await self._commit_batch(batch)
+
+    async def _commit_batch(self, batch):
+        outcomes = []
+        try:
+            async with WriterSessionLocal() as session:
+                for job, future, stats in batch:
+                    if future.cancelled():
+                        continue
+                    # Count the job's statements against the request that submitted it
+                    token = use_query_stats(stats)
+                    try:
+                        async with session.begin_nested():
+                            result = await job(session)
+                    except Exception as exc:
+                        outcomes.append((future, None, exc))
+                    else:
+                        outcomes.append((future, result, None))
+                    finally:
+                        reset_query_stats(token)
+                await session.commit()
+        except Exception as exc:
+            # The commit itself failed: nothing in the batch was written
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for future, result, exc in outcomes:
+            if future.done():
+                continue
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+write_queue = WriteQueue()
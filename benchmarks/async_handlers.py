@@ -0,0 +1,86 @@
+"""Requests/sec and p99 for a mixed read workload, optionally against a baseline ref.
+
+    python benchmarks/async_handlers.py --concurrency 64 --duration 10
+    python benchmarks/async_handlers.py --compare-ref <git ref>
+
+With --compare-ref the same workload also runs against a temporary git
+worktree of that ref, e.g. the last commit that still used sync handlers on
+the Starlette threadpool. --idle N additionally parks N keep-alive
+connections on the server for the whole run.
+"""
+import argparse
+import json
+import socket
+import threading
+import time
+from common import Client, admin_token, git_worktree, run_threads, running_server, summarize
+
+def workload(host, port, concurrency, duration, idle):
+    token = admin_token(host, port)
+    admin = {"Authorization": f"Bearer {token}"}
+    paths = [
+        ("/api/products", {}),
+        ("/api/categories", {}),
+        ("/api/orders?limit=20", admin),
+        ("/api/admin/analytics", admin),
+        ("/api/settings/discount", {}),
+    ]
+
+    idle_sockets = []
+    for _ in range(idle):
+        sock = socket.create_connection((host, port))
+        sock.sendall(b"GET /health HTTP/1.1\r\nHost: bench\r\n\r\n")
+        sock.recv(4096)
+        idle_sockets.append(sock)
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(index):
+        client = Client(host, port)
+        local, failed, step = [], 0, index
+        while time.monotonic() < stop_at:
+            path, headers = paths[step % len(paths)]
+            step += 1
+            status, _, latency = client.request("GET", path, headers=headers)
+            if status == 200:
+                local.append(latency)
+            else:
+                failed += 1
+        client.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    try:
+        run_threads(concurrency, worker)
+    finally:
+        for sock in idle_sockets:
+            sock.close()
+    return summarize(latencies, duration, errors[0])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--idle", type=int, default=0)
+    parser.add_argument("--compare-ref")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    results = {}
+    with running_server(port=args.port) as (host, port):
+        results["current"] = workload(host, port, args.concurrency, args.duration, args.idle)
+
+    if args.compare_ref:
+        with git_worktree(args.compare_ref) as path:
+            with running_server(port=args.port, app_dir=path) as (host, port):
+                results[args.compare_ref] = workload(
+                    host, port, args.concurrency, args.duration, args.idle
+                )
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Helpers shared by the benchmark scripts.
+
+Each benchmark boots the real app with uvicorn against a freshly seeded
+SQLite file in a temporary directory and drives it with plain http.client
+connections (one keep-alive connection per thread), so no extra packages
+are needed beyond requirements.txt.
+"""
+import gzip
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import brotli
+
+ROOT = Path(__file__).resolve().parent.parent
+
+ADMIN_PHONE = "9999999999"
+ADMIN_PASSWORD = "admin123"
+
+DECODERS = {"br": brotli.decompress, "gzip": gzip.decompress}
+
+@contextmanager
+def git_worktree(ref):
+    """Check out `ref` into a temporary worktree, e.g. to benchmark a baseline"""
+    path = tempfile.mkdtemp(prefix="kpg-ref-")
+    subprocess.run(
+        ["git", "worktree", "add", "--detach", path, ref],
+        cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        yield Path(path)
+    finally:
+        subprocess.run(
+            ["git", "worktree", "remove", "--force", path],
+            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+@contextmanager
+def running_server(port=8765, workers=1, seed_args=(), env=None, app_dir=ROOT):
+    """Seed a throwaway database, start uvicorn on it and yield its (host, port)"""
+    workdir = tempfile.mkdtemp(prefix="kpg-bench-")
+    try:
+        subprocess.run(
+            [sys.executable, str(Path(app_dir) / "app" / "seed.py"), *seed_args],
+            cwd=workdir, check=True, stdout=subprocess.DEVNULL
+        )
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--app-dir", str(app_dir),
+                "--port", str(port),
+                "--workers", str(workers),
+                "--log-level", "warning",
+            ],
+            cwd=workdir,
+            # Per-client rate limits would throttle the load generator itself
+            env={**os.environ, "KPG_RATE_LIMIT": "off", **(env or {})},
+        )
+        try:
+            _wait_until_up(port)
+            yield "127.0.0.1", port
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def _wait_until_up(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"server on port {port} did not start")
+
+class Client:
+    """A keep-alive HTTP connection that records per-request latency.
+
+    Compressed bodies (when the caller sent Accept-Encoding) come back
+    decoded; the latency covers the transfer, not the decoding.
+    """
+
+    def __init__(self, host, port, timeout=60):
+        self.conn = http.client.HTTPConnection(host, port, timeout=timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            self.conn.request(method, path, body=payload, headers=headers)
+            response = self.conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            return 0, b"", time.perf_counter() - start
+        latency = time.perf_counter() - start
+        decode = DECODERS.get(response.getheader("Content-Encoding", ""))
+        if decode is not None and data:
+            data = decode(data)
+        return response.status, data, latency
+
+    def close(self):
+        self.conn.close()
+
+def admin_token(host, port):
+    client = Client(host, port)
+    status, data, _ = client.request(
+        "POST", "/api/auth/admin/login",
+        {"phone": ADMIN_PHONE, "password": ADMIN_PASSWORD}
+    )
+    client.close()
+    if status != 200:
+        raise RuntimeError(f"admin login failed with {status}")
+    return json.loads(data)["access_token"]
+
+def run_threads(count, target, *args):
+    """Run target(index, *args) on `count` threads and wait for all of them"""
+    threads = [threading.Thread(target=target, args=(i, *args)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (milliseconds) for one run"""
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
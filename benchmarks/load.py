@@ -0,0 +1,341 @@
+"""End-to-end load test: mixed customer and admin traffic, per-route latency.
+
+    python benchmarks/load.py --concurrency 32 --duration 30 --output run.json
+    python benchmarks/load.py --orders 200000 --baseline run.json
+    python benchmarks/load.py --compare-ref <git ref>
+
+Boots app.main:app with uvicorn against a freshly seeded SQLite file
+(--products/--customers/--orders/--days scale it through seed.py) and runs
+--concurrency virtual users. Each user repeatedly picks a scenario by weight
+(--mix browse=50,checkout=15,...):
+
+  browse     categories, a category page, a search, a product detail
+  login      customer login, mostly existing customers, some sign-ups
+  checkout   create_order for one or two in-stock products
+  my_orders  the customer's own order history
+  dashboard  admin analytics and the latest orders page
+  status     admin order status update
+
+Requests made during --warmup are not counted. Results are JSON: requests/sec
+and p50/p95/p99 per route (paths with ids are grouped by template) and for
+the whole run, plus the run's configuration. --baseline compares against a
+previous --output file and exits with status 1 when a route's p95 regressed
+by more than --threshold percent; --compare-ref does the same against a git
+ref measured in the same invocation.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from common import ROOT, Client, admin_token, git_worktree, run_threads, running_server, summarize
+
+SCENARIOS = ["browse", "login", "checkout", "my_orders", "dashboard", "status"]
+DEFAULT_MIX = "browse=50,login=8,checkout=15,my_orders=10,dashboard=10,status=7"
+SEARCH_TERMS = ["ri", "ric", "bas", "oil", "tea", "cof", "bis", "chi", "soap", "sha", "dal", "masala"]
+STATUSES = ["CONFIRMED", "OUT_FOR_DELIVERY", "DELIVERED"]
+
+# Statuses that are a normal outcome for a route rather than a failure,
+# e.g. a checkout racing another one for the last unit of stock
+EXPECTED = {
+    "POST /api/orders": {409},
+}
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+class Recorder:
+    """Latencies and status codes per route, ignoring everything before `start_at`"""
+
+    def __init__(self, start_at):
+        self.start_at = start_at
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.scenarios = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def merge(self, local):
+        with self.lock:
+            for route, samples in local.latencies.items():
+                self.latencies[route].extend(samples)
+            for route, counts in local.statuses.items():
+                for code, count in counts.items():
+                    self.statuses[route][code] += count
+            for route, count in local.errors.items():
+                self.errors[route] += count
+            for name, count in local.scenarios.items():
+                self.scenarios[name] += count
+
+class VirtualUser:
+    def __init__(self, index, host, port, shared, recorder, base_headers, seed):
+        self.client = Client(host, port)
+        self.rng = random.Random(seed * 1000 + index)
+        self.shared = shared
+        self.recorder = recorder
+        self.local = Recorder(recorder.start_at)
+        self.base_headers = base_headers
+        self.admin = {**base_headers, "Authorization": f"Bearer {shared['admin_token']}"}
+        self.customer = None
+        self.order_ids = []
+
+    def call(self, route, method, path, body=None, headers=None):
+        status, data, latency = self.client.request(method, path, body, headers or self.base_headers)
+        if time.monotonic() >= self.local.start_at:
+            self.local.statuses[route][str(status)] += 1
+            if 200 <= status < 400 or status in EXPECTED.get(route, ()):
+                self.local.latencies[route].append(latency)
+            else:
+                self.local.errors[route] += 1
+        return status, data
+
+    def login(self, phone=None, name=None):
+        customers = self.shared["customer_phones"]
+        if phone is None:
+            if customers and self.rng.random() < 0.85:
+                phone = self.rng.choice(customers)
+            else:
+                phone = f"8{self.rng.randrange(10 ** 9):09d}"
+        status, data = self.call(
+            "POST /api/auth/customer/login", "POST", "/api/auth/customer/login",
+            {"phone": phone, "name": name or f"Load {phone[-4:]}"}
+        )
+        if status == 200:
+            login = json.loads(data)
+            self.customer = {
+                "id": login["user"]["id"],
+                "name": login["user"]["name"],
+                "phone": phone,
+                "headers": {**self.base_headers, "Authorization": f"Bearer {login['access_token']}"},
+            }
+
+    def browse(self):
+        self.call("GET /api/categories", "GET", "/api/categories")
+        category_id = self.rng.choice(self.shared["category_ids"])
+        self.call(
+            "GET /api/products?category_id", "GET",
+            f"/api/products?category_id={category_id}&available_only=true"
+        )
+        term = self.rng.choice(SEARCH_TERMS)
+        self.call("GET /api/products/search", "GET", f"/api/products/search?q={term}")
+        product = self.rng.choice(self.shared["products"])
+        self.call("GET /api/products/{id}", "GET", f"/api/products/{product['id']}")
+
+    def checkout(self):
+        if self.customer is None:
+            self.login()
+            if self.customer is None:
+                return
+        lines = self.rng.sample(self.shared["products"], k=min(self.rng.choice([1, 1, 2]), len(self.shared["products"])))
+        items = [{
+            "product_id": product["id"],
+            "product_name": product["name"],
+            "quantity": 1,
+            "price_at_order": product["price"],
+        } for product in lines]
+        status, data = self.call("POST /api/orders", "POST", "/api/orders", {
+            "customer_id": self.customer["id"],
+            "customer_name": self.customer["name"],
+            "customer_phone": self.customer["phone"],
+            "delivery_address": "Load Test Street 1",
+            "total_amount": sum(product["price"] for product in lines),
+            "payment_mode": self.rng.choice(["COD", "ONLINE"]),
+            "items": items,
+        }, self.customer["headers"])
+        if status == 200:
+            self.order_ids.append(json.loads(data)["id"])
+            with self.shared["lock"]:
+                self.shared["order_ids"].append(self.order_ids[-1])
+
+    def my_orders(self):
+        if self.customer is None:
+            self.login()
+            if self.customer is None:
+                return
+        self.call(
+            "GET /api/orders/customer/{id}", "GET",
+            f"/api/orders/customer/{self.customer['id']}?limit=20", headers=self.customer["headers"]
+        )
+
+    def dashboard(self):
+        self.call("GET /api/admin/analytics", "GET", "/api/admin/analytics", headers=self.admin)
+        self.call("GET /api/orders", "GET", "/api/orders?limit=20", headers=self.admin)
+
+    def status(self):
+        with self.shared["lock"]:
+            order_ids = self.shared["order_ids"]
+            order_id = self.rng.choice(order_ids) if order_ids else None
+        if order_id is None:
+            return
+        self.call(
+            "PUT /api/orders/{id}/status", "PUT", f"/api/orders/{order_id}/status",
+            {"status": self.rng.choice(STATUSES)}, self.admin
+        )
+
+    def run(self, mix, stop_at):
+        names = list(mix)
+        weights = [mix[name] for name in names]
+        while time.monotonic() < stop_at:
+            scenario = self.rng.choices(names, weights)[0]
+            getattr(self, scenario)()
+            if time.monotonic() >= self.local.start_at:
+                self.local.scenarios[scenario] += 1
+        self.client.close()
+        self.recorder.merge(self.local)
+
+def prepare(host, port, base_headers):
+    """Data every virtual user draws from; fetched once and not measured"""
+    client = Client(host, port)
+    _, data, _ = client.request("GET", "/api/categories", headers=base_headers)
+    category_ids = [category["id"] for category in json.loads(data)]
+    _, data, _ = client.request("GET", "/api/products?available_only=true", headers=base_headers)
+    products = [
+        {"id": product["id"], "name": product["name"], "price": product["price"]}
+        for product in json.loads(data) if product["stock"] > 0
+    ]
+    token = admin_token(host, port)
+    _, data, _ = client.request(
+        "GET", "/api/orders?limit=200", headers={**base_headers, "Authorization": f"Bearer {token}"}
+    )
+    orders = json.loads(data)
+    client.close()
+    return {
+        "category_ids": category_ids,
+        "products": products,
+        "admin_token": token,
+        "customer_phones": sorted({order["customer_phone"] for order in orders}),
+        "order_ids": [order["id"] for order in orders],
+        "lock": threading.Lock(),
+    }
+
+def workload(host, port, args):
+    base_headers = {"Accept-Encoding": "br, gzip"} if args.compress else {}
+    shared = prepare(host, port, base_headers)
+    if not shared["products"]:
+        raise SystemExit("no in-stock products to order; seed with --products")
+    mix = parse_mix(args.mix)
+
+    start_at = time.monotonic() + args.warmup
+    stop_at = start_at + args.duration
+    recorder = Recorder(start_at)
+
+    def worker(index):
+        VirtualUser(index, host, port, shared, recorder, base_headers, args.seed).run(mix, stop_at)
+
+    run_threads(args.concurrency, worker)
+
+    routes = {}
+    for route in sorted(set(recorder.latencies) | set(recorder.errors)):
+        routes[route] = {
+            **summarize(recorder.latencies[route], args.duration, recorder.errors[route]),
+            "status": dict(recorder.statuses[route]),
+        }
+    all_latencies = [latency for samples in recorder.latencies.values() for latency in samples]
+    return {
+        "overall": summarize(all_latencies, args.duration, sum(recorder.errors.values())),
+        "routes": routes,
+        "scenarios": dict(recorder.scenarios),
+    }
+
+def git_revision(path=ROOT):
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline, current, threshold):
+    """Per-route p95/p99/rps change; returns (report, regressed route names)"""
+    report, regressions = {}, []
+    for route, now in current["routes"].items():
+        before = baseline["routes"].get(route)
+        if not before or not before["requests"] or not now["requests"]:
+            continue
+        change = {}
+        for key in ("p50_ms", "p95_ms", "p99_ms", "rps"):
+            change[key] = round((now[key] - before[key]) / before[key] * 100, 1) if before[key] else None
+        report[route] = {"baseline": {k: before[k] for k in change}, "current": {k: now[k] for k in change}, "change_pct": change}
+        # Ignore sub-millisecond noise on very fast routes
+        if change["p95_ms"] is not None and change["p95_ms"] > threshold and now["p95_ms"] - before["p95_ms"] > 1.0:
+            regressions.append(route)
+    return report, regressions
+
+def run(args, app_dir=ROOT):
+    seed_args = []
+    for name in ("products", "customers", "orders", "days"):
+        value = getattr(args, name)
+        if value:
+            seed_args += [f"--{name}", str(value)]
+    with running_server(port=args.port, workers=args.workers, seed_args=seed_args, app_dir=app_dir) as (host, port):
+        result = workload(host, port, args)
+    result["meta"] = {
+        "git_revision": git_revision(app_dir),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "config": {
+            key: getattr(args, key) for key in (
+                "concurrency", "duration", "warmup", "workers", "mix", "compress", "seed",
+                "products", "customers", "orders", "days",
+            )
+        },
+    }
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before that")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights")
+    parser.add_argument("--compress", action="store_true", help="send Accept-Encoding: br, gzip")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the virtual users")
+    parser.add_argument("--products", type=int, default=0, help="synthetic products to seed")
+    parser.add_argument("--customers", type=int, default=0, help="synthetic customers to seed")
+    parser.add_argument("--orders", type=int, default=0, help="synthetic orders to seed")
+    parser.add_argument("--days", type=int, default=0, help="period the synthetic orders span")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--compare-ref", help="also run against this git ref and compare")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 regression tolerance in percent")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    elif args.compare_ref:
+        with git_worktree(args.compare_ref) as path:
+            baseline = run(args, app_dir=path)
+
+    result = run(args)
+    regressions = []
+    if baseline is not None:
+        result["comparison"], regressions = compare(baseline, result, args.threshold)
+        result["regressions"] = regressions
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if regressions:
+        print(f"p95 regressed by more than {args.threshold}% on: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Catalog read latency with and without a concurrent burst of admin logins.
+
+    python benchmarks/login_burst.py --readers 8 --logins 16 --duration 10
+
+Bcrypt runs in a dedicated, lower-priority process pool, so it never blocks
+the event loop, and logins beyond the pool's queue limit come back as 429
+(counted separately). GET /api/products latency only stays flat when there
+are spare cores for the pool's two workers; on smaller machines hashing
+still competes with requests (and with this script) for CPU. On one core
+p99 went from ~29 ms to ~72 ms during a burst (~122 ms before the pool was
+niced).
+"""
+import argparse
+import json
+import threading
+import time
+from common import ADMIN_PASSWORD, ADMIN_PHONE, Client, run_threads, running_server, summarize
+
+def measure_reads(host, port, readers, duration, login_threads=0):
+    read_latencies, login_statuses = [], []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def reader(_):
+        client = Client(host, port)
+        local = []
+        while time.monotonic() < stop_at:
+            status, _, latency = client.request("GET", "/api/products")
+            if status == 200:
+                local.append(latency)
+        client.close()
+        with lock:
+            read_latencies.extend(local)
+
+    def login(_):
+        client = Client(host, port)
+        local = []
+        while time.monotonic() < stop_at:
+            status, _, _ = client.request(
+                "POST", "/api/auth/admin/login",
+                {"phone": ADMIN_PHONE, "password": ADMIN_PASSWORD}
+            )
+            local.append(status)
+            if status == 429:
+                # Well-behaved clients honour Retry-After
+                time.sleep(1)
+        client.close()
+        with lock:
+            login_statuses.extend(local)
+
+    def worker(index):
+        if index < readers:
+            reader(index)
+        else:
+            login(index)
+
+    run_threads(readers + login_threads, worker)
+    result = summarize(read_latencies, duration)
+    if login_threads:
+        result["logins_ok"] = login_statuses.count(200)
+        result["logins_429"] = login_statuses.count(429)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    with running_server(port=args.port) as (host, port):
+        baseline = measure_reads(host, port, args.readers, args.duration)
+        burst = measure_reads(host, port, args.readers, args.duration, args.logins)
+
+    print(json.dumps({"baseline": baseline, "during_login_burst": burst}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Concurrent checkouts against one product must never oversell it.
+
+    python benchmarks/order_concurrency.py --orders 300 --stock 120
+
+Creates a product with --stock units, logs in --orders customers, then has
+every customer POST /api/orders for one unit at the same moment. Exactly
+--stock orders must succeed, the rest must come back 409, and the product
+must end with stock 0 and is_available false. Exits with status 1 (and
+prints what went wrong) otherwise.
+"""
+import argparse
+import json
+import sys
+import threading
+from collections import Counter
+from common import Client, admin_token, run_threads, running_server
+
+def create_product(host, port, token, stock):
+    client = Client(host, port)
+    headers = {"Authorization": f"Bearer {token}"}
+    _, data, _ = client.request("GET", "/api/categories")
+    category_id = json.loads(data)[0]["id"]
+    status, data, _ = client.request("POST", "/api/products", {
+        "name": "Concurrency Test Item",
+        "category_id": category_id,
+        "price": 10.0,
+        "stock": stock,
+    }, headers)
+    client.close()
+    if status != 200:
+        raise RuntimeError(f"creating the product failed with {status}")
+    return json.loads(data)
+
+def log_in_customers(host, port, count):
+    customers = [None] * count
+
+    def login(index):
+        client = Client(host, port)
+        phone = f"7{index:09d}"
+        status, data, _ = client.request(
+            "POST", "/api/auth/customer/login", {"phone": phone, "name": f"Buyer {index}"}
+        )
+        client.close()
+        if status != 200:
+            raise RuntimeError(f"customer login failed with {status}")
+        login = json.loads(data)
+        customers[index] = {
+            "id": login["user"]["id"],
+            "phone": phone,
+            "headers": {"Authorization": f"Bearer {login['access_token']}"},
+        }
+
+    run_threads(count, login)
+    return customers
+
+def place_orders(host, port, product, customers):
+    """POST one order per customer, all released together; returns status -> count"""
+    statuses = Counter()
+    lock = threading.Lock()
+    clients = [Client(host, port) for _ in customers]
+    ready = threading.Barrier(len(customers))
+
+    def order(index):
+        customer = customers[index]
+        ready.wait()
+        status, _, _ = clients[index].request("POST", "/api/orders", {
+            "customer_id": customer["id"],
+            "customer_name": f"Buyer {index}",
+            "customer_phone": customer["phone"],
+            "delivery_address": "Concurrency Street 1",
+            "total_amount": product["price"],
+            "payment_mode": "COD",
+            "items": [{
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "quantity": 1,
+                "price_at_order": product["price"],
+            }],
+        }, customer["headers"])
+        clients[index].close()
+        with lock:
+            statuses[status] += 1
+
+    run_threads(len(customers), order)
+    return statuses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=120)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    if not 0 < args.stock < args.orders:
+        raise SystemExit("--stock must be between 1 and --orders - 1")
+
+    with running_server(port=args.port, workers=args.workers) as (host, port):
+        token = admin_token(host, port)
+        product = create_product(host, port, token, args.stock)
+        customers = log_in_customers(host, port, args.orders)
+        statuses = place_orders(host, port, product, customers)
+
+        client = Client(host, port)
+        _, data, _ = client.request("GET", f"/api/products/{product['id']}")
+        client.close()
+        final = json.loads(data)
+
+    result = {
+        "orders": args.orders,
+        "initial_stock": args.stock,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+        "final_stock": final["stock"],
+        "final_is_available": final["is_available"],
+    }
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if statuses[200] != args.stock:
+        failures.append(f"{statuses[200]} orders succeeded, expected {args.stock}")
+    if statuses[409] != args.orders - args.stock:
+        failures.append(f"{statuses[409]} orders got 409, expected {args.orders - args.stock}")
+    if final["stock"] != 0:
+        failures.append(f"final stock is {final['stock']}, expected 0")
+    if final["is_available"]:
+        failures.append("product is still available")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Serialization-only cost of large product and order lists, no server or database.
+
+    python benchmarks/serialization.py --products 5000 --orders 2000 --items 5
+
+Builds detached ORM objects in memory and times each stage FastAPI goes
+through for a response_model route: validating the objects into the
+response schema, dumping to JSON-compatible Python, and encoding with the
+stdlib json module (JSONResponse) or orjson (ORJSONResponse). Pydantic's
+own dump_json (what the catalog cache uses) and the cost/size of gzip and
+brotli on the resulting body are reported alongside. Times are the median
+of --repeat runs, in milliseconds.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import List
+from common import ROOT
+
+sys.path.insert(0, str(ROOT))
+
+import brotli
+import orjson
+from pydantic import TypeAdapter
+from app.models import Order, OrderItem, Product
+from app.schemas import OrderResponse, ProductResponse
+
+def make_products(count):
+    now = datetime(2024, 1, 1)
+    return [
+        Product(
+            id=i, category_id=i % 12 + 1, name=f"Product {i}", price=10 + i % 500 * 0.25,
+            stock=i % 90, is_available=i % 7 != 0,
+            image_path=f"/uploads/products/{i:064x}.jpg" if i % 3 else None,
+            created_at=now, updated_at=now + timedelta(seconds=i)
+        )
+        for i in range(1, count + 1)
+    ]
+
+def make_orders(count, items_per_order):
+    now = datetime(2024, 1, 1)
+    orders = []
+    for i in range(1, count + 1):
+        items = [
+            OrderItem(
+                id=i * items_per_order + j, order_id=i, product_id=j + 1,
+                product_name=f"Product {j + 1}", quantity=j % 4 + 1, price_at_order=12.5 + j
+            )
+            for j in range(items_per_order)
+        ]
+        orders.append(Order(
+            id=i, customer_id=i % 300 + 1, customer_name=f"Customer {i % 300}",
+            customer_phone=f"9{i:09d}", delivery_address=f"{i} Market Road, Block {i % 40}",
+            total_amount=sum(item.quantity * item.price_at_order for item in items),
+            payment_mode="COD", status="PENDING", note=None,
+            created_at=now + timedelta(minutes=i), updated_at=now + timedelta(minutes=i),
+            items=items
+        ))
+    return orders
+
+def timed(fn, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 2), result
+
+def measure(objects, schema, repeat):
+    adapter = TypeAdapter(List[schema])
+    validate_ms, models = timed(lambda: adapter.validate_python(objects, from_attributes=True), repeat)
+    dump_ms, plain = timed(lambda: adapter.dump_python(models, mode="json"), repeat)
+    json_ms, json_body = timed(
+        lambda: json.dumps(plain, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode(),
+        repeat
+    )
+    orjson_ms, body = timed(lambda: orjson.dumps(plain), repeat)
+    dump_json_ms, _ = timed(lambda: adapter.dump_json(models), repeat)
+    gzip_ms, gzipped = timed(lambda: zlib.compress(body, 6, wbits=31), repeat)
+    brotli_ms, brotlied = timed(lambda: brotli.compress(body, quality=4), repeat)
+    return {
+        "validate_ms": validate_ms,
+        "dump_python_ms": dump_ms,
+        "json_encode_ms": json_ms,
+        "orjson_encode_ms": orjson_ms,
+        "pydantic_dump_json_ms": dump_json_ms,
+        "jsonresponse_total_ms": round(validate_ms + dump_ms + json_ms, 2),
+        "orjsonresponse_total_ms": round(validate_ms + dump_ms + orjson_ms, 2),
+        "body_bytes": len(body),
+        "json_body_bytes": len(json_body),
+        "gzip_ms": gzip_ms,
+        "gzip_bytes": len(gzipped),
+        "brotli_ms": brotli_ms,
+        "brotli_bytes": len(brotlied),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=5, help="line items per order")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    results = {
+        "products": measure(make_products(args.products), ProductResponse, args.repeat),
+        "orders": measure(make_orders(args.orders, args.items), OrderResponse, args.repeat),
+    }
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
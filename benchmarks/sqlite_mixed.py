@@ -0,0 +1,140 @@
+"""Mixed read/write throughput: catalog and order reads alongside checkouts.
+
+    python benchmarks/sqlite_mixed.py --concurrency 32 --write-ratio 0.3
+    python benchmarks/sqlite_mixed.py --workers 4 --compare-ref <git ref>
+
+Each client alternates reads (product list, order page, analytics) with
+writes (create_order, order status updates) at the given ratio. Reports
+throughput and latency separately for reads and writes, plus the number of
+failed requests (e.g. "database is locked" surfacing as 500s).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from common import Client, admin_token, git_worktree, run_threads, running_server, summarize
+
+STATUSES = ["CONFIRMED", "OUT_FOR_DELIVERY", "DELIVERED"]
+
+def prepare(host, port, admin):
+    """Give every seeded product effectively unlimited stock"""
+    client = Client(host, port)
+    _, data, _ = client.request("GET", "/api/products")
+    products = json.loads(data)
+    for product in products:
+        client.request(
+            "PUT", f"/api/products/{product['id']}", {"stock": 10 ** 9}, admin
+        )
+    client.close()
+    return products
+
+def workload(host, port, concurrency, duration, write_ratio):
+    admin = {"Authorization": f"Bearer {admin_token(host, port)}"}
+    products = prepare(host, port, admin)
+    reads = [
+        ("/api/products", {}),
+        ("/api/orders?limit=20", admin),
+        ("/api/admin/analytics", admin),
+    ]
+
+    results = {"reads": [], "writes": []}
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = None
+
+    def worker(index):
+        rng = random.Random(index)
+        client = Client(host, port)
+        phone = f"7{index:09d}"
+        _, data, _ = client.request(
+            "POST", "/api/auth/customer/login", {"phone": phone, "name": f"Bench {index}"}
+        )
+        login = json.loads(data)
+        customer = {"Authorization": f"Bearer {login['access_token']}"}
+        order_ids = []
+        local = {"reads": [], "writes": []}
+        failed = 0
+
+        while time.monotonic() < stop_at:
+            if rng.random() < write_ratio:
+                kind = "writes"
+                if order_ids and rng.random() < 0.3:
+                    status, _, latency = client.request(
+                        "PUT", f"/api/orders/{rng.choice(order_ids)}/status",
+                        {"status": rng.choice(STATUSES)}, admin
+                    )
+                else:
+                    product = rng.choice(products)
+                    status, data, latency = client.request("POST", "/api/orders", {
+                        "customer_id": login["user"]["id"],
+                        "customer_name": login["user"]["name"],
+                        "customer_phone": phone,
+                        "delivery_address": "Benchmark Street 1",
+                        "total_amount": product["price"],
+                        "payment_mode": "COD",
+                        "items": [{
+                            "product_id": product["id"],
+                            "product_name": product["name"],
+                            "quantity": 1,
+                            "price_at_order": product["price"],
+                        }],
+                    }, customer)
+                    if status == 200:
+                        order_ids.append(json.loads(data)["id"])
+            else:
+                kind = "reads"
+                path, headers = rng.choice(reads)
+                status, _, latency = client.request("GET", path, headers=headers)
+
+            if status == 200:
+                local[kind].append(latency)
+            else:
+                failed += 1
+
+        client.close()
+        with lock:
+            results["reads"].extend(local["reads"])
+            results["writes"].extend(local["writes"])
+            errors[0] += failed
+
+    stop_at = time.monotonic() + duration
+    run_threads(concurrency, worker)
+    return {
+        "reads": summarize(results["reads"], duration),
+        "writes": summarize(results["writes"], duration),
+        "errors": errors[0],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--compare-ref")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    runs = [("current", None)]
+    if args.compare_ref:
+        runs.append((args.compare_ref, args.compare_ref))
+
+    results = {}
+    for label, ref in runs:
+        if ref is None:
+            with running_server(port=args.port, workers=args.workers) as (host, port):
+                results[label] = workload(
+                    host, port, args.concurrency, args.duration, args.write_ratio
+                )
+        else:
+            with git_worktree(ref) as path:
+                with running_server(port=args.port, workers=args.workers, app_dir=path) as (host, port):
+                    results[label] = workload(
+                        host, port, args.concurrency, args.duration, args.write_ratio
+                    )
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
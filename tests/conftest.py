@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# app.database reads the path when it is imported, so point it at a scratch
+# database before any test imports the app
+os.environ["KPG_DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="kpg-tests-"), "kpg_shop.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
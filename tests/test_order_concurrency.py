@@ -0,0 +1,115 @@
+"""Concurrent checkouts against one product must never oversell it.
+
+Orders go through the write queue and, at the same time, through separate
+writer connections standing in for other uvicorn workers, so the
+conditional UPDATE in _reserve_stock is what keeps stock from going
+negative.
+"""
+import asyncio
+from typing import Tuple
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from app.changes import ensure_change_tracking
+from app.database import ASYNC_SQLALCHEMY_DATABASE_URL, Base, WriterSessionLocal, _apply_sqlite_pragmas, engine
+from app.models import Category, Customer, Order, OrderItem, Product
+from app.routers.orders import _place_order
+from app.schemas import OrderCreate
+from app.search import ensure_search_index
+from app.writer import write_queue
+
+STOCK = 40
+ORDERS = 100
+OTHER_WORKERS = 3
+
+@pytest.fixture(scope="module", autouse=True)
+def schema():
+    Base.metadata.create_all(bind=engine)
+    ensure_change_tracking(engine)
+    ensure_search_index(engine)
+
+def _worker_engine():
+    """A writer connection of its own, set up like database.writer_engine"""
+    worker_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+
+    @event.listens_for(worker_engine.sync_engine, "connect")
+    def connect(dbapi_connection, connection_record):
+        _apply_sqlite_pragmas(dbapi_connection, connection_record)
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(worker_engine.sync_engine, "begin")
+    def begin(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return worker_engine
+
+async def _setup() -> Tuple[int, int]:
+    async with WriterSessionLocal() as db:
+        category = Category(name="Concurrency")
+        customer = Customer(name="Buyer", phone="7000000000")
+        db.add_all([category, customer])
+        await db.flush()
+        product = Product(name="Last units", category_id=category.id, price=10.0, stock=STOCK, is_available=True)
+        db.add(product)
+        await db.commit()
+        return product.id, customer.id
+
+def _order(product_id: int, customer_id: int) -> OrderCreate:
+    return OrderCreate(
+        customer_id=customer_id,
+        customer_name="Buyer",
+        customer_phone="7000000000",
+        delivery_address="Somewhere",
+        total_amount=10.0,
+        payment_mode="COD",
+        items=[{"product_id": product_id, "product_name": "Last units", "quantity": 1, "price_at_order": 10.0}]
+    )
+
+async def _place_directly(session_factory, order: OrderCreate):
+    async with session_factory() as db:
+        async with db.begin():
+            return await _place_order(db, order)
+
+async def _race():
+    product_id, customer_id = await _setup()
+    engines = [_worker_engine() for _ in range(OTHER_WORKERS)]
+    factories = [async_sessionmaker(worker_engine, class_=AsyncSession, expire_on_commit=False) for worker_engine in engines]
+    try:
+        attempts = []
+        for index in range(ORDERS):
+            order = _order(product_id, customer_id)
+            slot = index % (OTHER_WORKERS + 1)
+            if slot == 0:
+                attempts.append(write_queue.submit(lambda db, order=order: _place_order(db, order)))
+            else:
+                attempts.append(_place_directly(factories[slot - 1], order))
+        results = await asyncio.gather(*attempts, return_exceptions=True)
+
+        async with WriterSessionLocal() as db:
+            product = await db.get(Product, product_id)
+            ordered = await db.scalar(
+                select(func.coalesce(func.sum(OrderItem.quantity), 0)).where(OrderItem.product_id == product_id)
+            )
+            return results, product, ordered
+    finally:
+        await write_queue.stop()
+        for worker_engine in engines:
+            await worker_engine.dispose()
+
+def test_concurrent_checkouts_never_oversell():
+    results, product, ordered = asyncio.run(_race())
+
+    unexpected = [r for r in results if isinstance(r, Exception) and not isinstance(r, HTTPException)]
+    assert not unexpected, unexpected
+    placed = [r for r in results if isinstance(r, Order)]
+    conflicts = [r for r in results if isinstance(r, HTTPException)]
+
+    assert len(placed) == STOCK
+    assert len(conflicts) == ORDERS - STOCK
+    assert all(c.status_code == 409 for c in conflicts)
+    assert all(item["available"] >= 0 for c in conflicts for item in c.detail["items"])
+    assert product.stock == 0
+    assert product.is_available is False
+    assert ordered == STOCK